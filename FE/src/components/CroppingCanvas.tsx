@@ -27,6 +27,9 @@ export const CroppingCanvas = ({ imageUrl, onCropSave, saving = false }: Croppin
   
   const containerRef = useRef<HTMLDivElement>(null);
   const imageRef = useRef<HTMLImageElement>(null);
+  // Mouse moves are coalesced to one crop-area update per animation frame
+  const frameRef = useRef<number | null>(null);
+  const pendingPointRef = useRef<{ x: number; y: number } | null>(null);
 
   const handleImageLoad = () => {
     if (imageRef.current) {
@@ -52,6 +55,7 @@ export const CroppingCanvas = ({ imageUrl, onCropSave, saving = false }: Croppin
     if (!imageLoaded) return;
     
     const point = getMousePosition(e);
+    pendingPointRef.current = null;
     setStartPoint(point);
     setIsDragging(true);
     setCropArea(null);
@@ -60,16 +64,23 @@ export const CroppingCanvas = ({ imageUrl, onCropSave, saving = false }: Croppin
   const handleMouseMove = (e: React.MouseEvent) => {
     if (!isDragging || !imageLoaded) return;
     
-    const currentPoint = getMousePosition(e);
+    pendingPointRef.current = getMousePosition(e);
+    if (frameRef.current !== null) return;
     
-    const newCropArea = {
-      x: Math.min(startPoint.x, currentPoint.x),
-      y: Math.min(startPoint.y, currentPoint.y),
-      width: Math.abs(currentPoint.x - startPoint.x),
-      height: Math.abs(currentPoint.y - startPoint.y)
-    };
-    
-    setCropArea(newCropArea);
+    frameRef.current = requestAnimationFrame(() => {
+      frameRef.current = null;
+      const currentPoint = pendingPointRef.current;
+      if (!currentPoint) return;
+      
+      const newCropArea = {
+        x: Math.min(startPoint.x, currentPoint.x),
+        y: Math.min(startPoint.y, currentPoint.y),
+        width: Math.abs(currentPoint.x - startPoint.x),
+        height: Math.abs(currentPoint.y - startPoint.y)
+      };
+      
+      setCropArea(newCropArea);
+    });
   };
 
   const handleMouseUp = () => {
@@ -104,6 +115,13 @@ export const CroppingCanvas = ({ imageUrl, onCropSave, saving = false }: Croppin
     onCropSave(cropData);
   };
 
+  // Drop any pending frame on unmount
+  useEffect(() => {
+    return () => {
+      if (frameRef.current !== null) cancelAnimationFrame(frameRef.current);
+    };
+  }, []);
+
   // Reset crop area when image changes
   useEffect(() => {
     setCropArea(null);
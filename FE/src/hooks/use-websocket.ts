@@ -3,7 +3,10 @@ import { WS_URL } from "@/lib/api";
 
 export type WebSocketMessage = {
   event: string;
-  job_id: number;
+  // Worker job events carry job_id; per-submission regrade events carry submission_id/item_id
+  job_id?: number;
+  submission_id?: number;
+  item_id?: number;
   status: string;
   result?: any;
 };
@@ -56,7 +56,11 @@ export const uploadExamFiles = (examId: number, files: File[]): Promise<{ image_
 export const getExamImages = (examId: number): Promise<{ count: number; urls: string[] }> =>
   request<{ count: number; urls: string[] }>(`/exams/${examId}/images/`);
 
-export const listExamQuestions = (examId: number): Promise<{ count: number; items: { id: number; label: string }[] }> =>
+export type QuestionSolution = { answer: string; steps: unknown[]; points: number[]; generated_at: string; verified: boolean };
+
+export const listExamQuestions = (
+  examId: number
+): Promise<{ count: number; items: { id: number; label: string; solution: QuestionSolution | null }[] }> =>
   request(`/exams/${examId}/questions/`);
 
 export const createQuestion = (payload: CreateQuestionPayload) =>
@@ -66,12 +70,12 @@ export const createQuestion = (payload: CreateQuestionPayload) =>
     body: JSON.stringify(payload),
   });
 
-export const solveQuestion = (questionId: number) =>
+export const solveQuestion = (questionId: number): Promise<QuestionSolution & { total_points?: number }> =>
   request(`/questions/${questionId}/solve/`, { method: "POST" });
 
 export const getQuestionSolution = (
   questionId: number
-): Promise<{ answer: string; steps: unknown[]; points: number[]; generated_at: string; verified: boolean }> =>
+): Promise<QuestionSolution> =>
   request(`/questions/${questionId}/solution/`);
 
 export const verifyQuestionSolution = (questionId: number, verified: boolean) =>
@@ -81,7 +85,18 @@ export const verifyQuestionSolution = (questionId: number, verified: boolean) =>
     body: JSON.stringify({ verified }),
   });
 
-export const getQuestionImages = (questionId: number): Promise<{ count: number; urls: string[]; has_multiple: boolean }> =>
+export const verifyExamSolutions = (
+  examId: number,
+  verified: boolean,
+  questionIds?: number[]
+): Promise<{ updated: number; verified: boolean }> =>
+  request(`/exams/${examId}/verify-solutions/`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ verified, question_ids: questionIds }),
+  });
+
+export const getQuestionImages = (questionId: number): Promise<{ count: number; urls: string[]; thumbnail_urls?: string[]; has_multiple: boolean }> =>
   request(`/questions/${questionId}/images/`);
 
 export const deleteQuestion = (questionId: number) =>
@@ -172,6 +187,7 @@ export const getSubmissionItemsList = (submissionId: number): Promise<{
     has_images: boolean;
     image_count: number;
     image_urls: string[];
+    thumbnail_urls?: string[];
     has_multiple_images: boolean;
   }>;
 }> => request(`/submissions/${submissionId}/items-list/`);
@@ -8,7 +8,7 @@ import { Crop, FileText, CheckCircle, Loader2, ChevronLeft, ChevronRight, ArrowL
 import { CroppingCanvas } from "@/components/CroppingCanvas";
 import { toast } from "sonner";
 import { Link, useSearchParams } from "react-router-dom";
-import { createQuestion, getExamImages, listExamQuestions, solveQuestion, getQuestionSolution, verifyQuestionSolution, getQuestionImages, appendQuestionImage, deleteQuestion, deleteQuestionImage } from "@/lib/api";
+import { createQuestion, getExamImages, listExamQuestions, solveQuestion, verifyQuestionSolution, verifyExamSolutions, getQuestionImages, appendQuestionImage, deleteQuestion, deleteQuestionImage } from "@/lib/api";
 
 type QuestionStatus = "waiting" | "solving" | "ready";
 
@@ -25,11 +25,22 @@ const CropExam = () => {
   const [loadingQuestions, setLoadingQuestions] = useState(false);
   const [solutionByQuestionId, setSolutionByQuestionId] = useState<Record<number, { answer?: string; steps?: any[]; points?: number[]; generated_at?: string; verified?: boolean }>>({});
   const [busyQuestionId, setBusyQuestionId] = useState<number | null>(null);
+  const [verifyingAll, setVerifyingAll] = useState(false);
   const [expandedQuestions, setExpandedQuestions] = useState<Set<number>>(new Set());
   const [questionImages, setQuestionImages] = useState<Record<number, string[]>>({});
+  const [questionThumbs, setQuestionThumbs] = useState<Record<number, string[]>>({});
   const [viewModes, setViewModes] = useState<Record<number, 'images' | 'solution'>>({});
 
   const currentImage = useMemo(() => images[pageIndex] || "", [images, pageIndex]);
+  const unverifiedCount = useMemo(
+    () => Object.values(solutionByQuestionId).filter((sol) => sol?.generated_at && !sol?.verified).length,
+    [solutionByQuestionId]
+  );
+
+  const storeQuestionImages = (questionId: number, res: { urls: string[]; thumbnail_urls?: string[] }) => {
+    setQuestionImages(prev => ({ ...prev, [questionId]: res.urls }));
+    setQuestionThumbs(prev => ({ ...prev, [questionId]: res.thumbnail_urls || res.urls }));
+  };
 
   useEffect(() => {
     if (!examId) return;
@@ -53,36 +64,28 @@ const CropExam = () => {
     let mounted = true;
     setLoadingQuestions(true);
     listExamQuestions(examId)
-      .then(async (res) => {
+      .then((res) => {
         if (!mounted) return;
-        // Load solution status for each question to determine initial status
-        const mapped = (res.items || []).map((it: any) => ({ id: it.id, label: it.label, status: "waiting" as QuestionStatus }));
-        setQuestions(mapped);
-        
-        // Fetch solution data for all questions to set proper status
-        for (const q of mapped) {
-          try {
-            const sol = await getQuestionSolution(q.id);
-            if (!mounted) return;
-            if (sol?.generated_at) {
-              setQuestions(prev => prev.map(item => 
-                item.id === q.id ? { ...item, status: "ready" as QuestionStatus } : item
-              ));
-              setSolutionByQuestionId(prev => ({
-                ...prev,
-                [q.id]: {
-                  answer: sol.answer,
-                  steps: sol.steps,
-                  points: sol.points,
-                  generated_at: sol.generated_at,
-                  verified: sol.verified,
-                }
-              }));
-            }
-          } catch (e) {
-            // Question doesn't have solution yet, keep as "waiting"
+        // Solutions come back with the list, so status is known without extra requests
+        const items = res.items || [];
+        setQuestions(items.map((it: any) => ({
+          id: it.id,
+          label: it.label,
+          status: (it.solution?.generated_at ? "ready" : "waiting") as QuestionStatus,
+        })));
+        const solutions: Record<number, any> = {};
+        for (const it of items) {
+          if (it.solution?.generated_at) {
+            solutions[it.id] = {
+              answer: it.solution.answer,
+              steps: it.solution.steps,
+              points: it.solution.points,
+              generated_at: it.solution.generated_at,
+              verified: it.solution.verified,
+            };
           }
         }
+        setSolutionByQuestionId(solutions);
       })
       .catch((e) => toast.error(e?.message || "Failed to load questions"))
       .finally(() => setLoadingQuestions(false));
@@ -121,7 +124,7 @@ const CropExam = () => {
         toast.success(`Added image to question`);
         // Refresh images for this question
         const res = await getQuestionImages(selectedQuestionId);
-        setQuestionImages(prev => ({ ...prev, [selectedQuestionId]: res.urls }));
+        storeQuestionImages(selectedQuestionId, res);
       } else {
         // Creating a new question
         if (!questionLabel) {
@@ -153,8 +156,8 @@ const CropExam = () => {
       // Set status to "solving"
       setQuestions(prev => prev.map(q => q.id === questionId ? { ...q, status: "solving" as QuestionStatus } : q));
       
-      await solveQuestion(questionId);
-      const sol = await getQuestionSolution(questionId);
+      // The solve response already carries the saved solution
+      const sol = await solveQuestion(questionId);
       
       // Set status to "ready" after solution is generated
       setQuestions(prev => prev.map(q => q.id === questionId ? { ...q, status: "ready" as QuestionStatus } : q));
@@ -197,6 +200,28 @@ const CropExam = () => {
     }
   };
 
+  const handleVerifyAll = async () => {
+    const ids = Object.keys(solutionByQuestionId)
+      .map(Number)
+      .filter((id) => solutionByQuestionId[id]?.generated_at && !solutionByQuestionId[id]?.verified);
+    if (!ids.length) return;
+    try {
+      setVerifyingAll(true);
+      // One request / one UPDATE for the whole batch
+      const res = await verifyExamSolutions(examId, true, ids);
+      setSolutionByQuestionId((prev) => {
+        const next = { ...prev };
+        for (const id of ids) next[id] = { ...(next[id] || {}), verified: true };
+        return next;
+      });
+      toast.success(`Verified ${res?.updated ?? ids.length} solutions`);
+    } catch (e: any) {
+      toast.error(e?.message || "Verify failed");
+    } finally {
+      setVerifyingAll(false);
+    }
+  };
+
   const handleToggleQuestionExpand = async (questionId: number) => {
     const isExpanded = expandedQuestions.has(questionId);
     const newExpanded = new Set(expandedQuestions);
@@ -213,7 +238,7 @@ const CropExam = () => {
       if (!questionImages[questionId]) {
         try {
           const res = await getQuestionImages(questionId);
-          setQuestionImages(prev => ({ ...prev, [questionId]: res.urls }));
+          storeQuestionImages(questionId, res);
         } catch (e: any) {
           toast.error(e?.message || "Failed to load images");
         }
@@ -261,7 +286,7 @@ const CropExam = () => {
       toast.success("Image deleted");
       // Refresh images for this question
       const res = await getQuestionImages(questionId);
-      setQuestionImages(prev => ({ ...prev, [questionId]: res.urls }));
+      storeQuestionImages(questionId, res);
     } catch (e: any) {
       toast.error(e?.message || "Failed to delete image");
     }
@@ -308,6 +333,12 @@ const CropExam = () => {
           </Button>
           <h2 className="text-xl font-bold text-foreground mb-2">Questions</h2>
           <p className="text-sm text-muted-foreground">Crop and generate solutions</p>
+          {unverifiedCount > 0 && (
+            <Button size="sm" variant="outline" className="mt-2" onClick={handleVerifyAll} disabled={verifyingAll}>
+              {verifyingAll ? <Loader2 className="h-4 w-4 animate-spin" /> : <CheckCircle className="h-4 w-4" />}
+              <span className="ml-1">Verify all ({unverifiedCount})</span>
+            </Button>
+          )}
         </div>
 
         <div className="space-y-3">
@@ -317,6 +348,7 @@ const CropExam = () => {
             const isBusy = busyQuestionId === question.id;
             const isExpanded = expandedQuestions.has(question.id);
             const images = questionImages[question.id] || [];
+            const thumbs = questionThumbs[question.id] || images;
             return (
               <Card key={question.id} className="p-4 space-y-2">
                 <div className="flex items-start justify-between">
@@ -384,8 +416,10 @@ const CropExam = () => {
                         {images.map((imgUrl, idx) => (
                           <div key={idx} className="relative border border-border rounded overflow-hidden group">
                             <img 
-                              src={imgUrl} 
+                              src={thumbs[idx] || imgUrl} 
                               alt={`Question ${question.label} - ${idx + 1}`}
+                              loading="lazy"
+                              decoding="async"
                               className="w-full h-20 object-contain bg-muted cursor-pointer"
                               onClick={() => window.open(imgUrl, '_blank')}
                             />
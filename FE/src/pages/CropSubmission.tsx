@@ -17,7 +17,7 @@ const CropSubmission = () => {
   const submissionId = Number(sp.get("submissionId"));
 
   const [studentName, setStudentName] = useState<string>("");
-  const [questions, setQuestions] = useState<Array<{ id: number; label: string; status: CropStatus; itemId?: number; imageUrls?: string[] }>>([]);
+  const [questions, setQuestions] = useState<Array<{ id: number; label: string; status: CropStatus; itemId?: number; imageUrls?: string[]; thumbUrls?: string[] }>>([]);
   const [selectedQuestionId, setSelectedQuestionId] = useState<number | null>(null);
   const [images, setImages] = useState<string[]>([]);
   const [pageIndex, setPageIndex] = useState(0);
@@ -133,6 +133,7 @@ const CropSubmission = () => {
             status: item?.has_images ? "done" as CropStatus : "pending" as CropStatus,
             itemId: item?.item_id,
             imageUrls: item?.image_urls || [],
+            thumbUrls: item?.thumbnail_urls || item?.image_urls || [],
           };
         });
         setQuestions(mapped);
@@ -164,21 +165,21 @@ const CropSubmission = () => {
 
     try {
       setSaving(true);
-      const itemsList = await getSubmissionItemsList(submissionId);
-      const existing = itemsList.items.find((i: any) => i.question_id === selectedQuestionId);
-      if (!existing) {
+      // The items list is refreshed after every save/delete, so the local itemId is current
+      const existingItemId = questions.find((q) => q.id === selectedQuestionId)?.itemId;
+      if (existingItemId == null) {
         // First image for this question -> create item
         await createSubmissionItem(submissionId, { question_id: selectedQuestionId, page_index: pageIndex, bbox });
       } else {
         // Item exists -> append another answer image
-        await appendSubmissionItemImage(existing.item_id, { page_index: pageIndex, bbox });
+        await appendSubmissionItemImage(existingItemId, { page_index: pageIndex, bbox });
       }
       toast.success("Answer crop saved. Click Grade to start grading.");
       // Refresh items list after save/append
       const itemsList2 = await getSubmissionItemsList(submissionId);
       setQuestions((prev) => prev.map((q) => {
         const item = itemsList2.items.find((i: any) => i.question_id === q.id);
-        return item?.has_images ? { ...q, status: "done" as CropStatus, itemId: item.item_id, imageUrls: item.image_urls } : q;
+        return item?.has_images ? { ...q, status: "done" as CropStatus, itemId: item.item_id, imageUrls: item.image_urls, thumbUrls: item.thumbnail_urls || item.image_urls } : q;
       }));
     } catch (e: any) {
       toast.error(e?.message || "Failed to save answer crop");
@@ -197,7 +198,7 @@ const CropSubmission = () => {
       toast.success("Item deleted");
       // Update local state
       setQuestions((prev) => prev.map((q) => 
-        q.itemId === itemId ? { ...q, status: "pending" as CropStatus, itemId: undefined, imageUrls: [] } : q
+        q.itemId === itemId ? { ...q, status: "pending" as CropStatus, itemId: undefined, imageUrls: [], thumbUrls: [] } : q
       ));
     } catch (e: any) {
       toast.error(e?.message || "Failed to delete item");
@@ -339,8 +340,10 @@ const CropSubmission = () => {
                         onClick={() => setPreviewImageUrl(url)}
                       >
                         <img 
-                          src={url} 
+                          src={question.thumbUrls?.[idx] || url} 
                           alt={`Answer ${idx + 1}`}
+                          loading="lazy"
+                          decoding="async"
                           className="w-full h-full object-contain bg-white"
                         />
                       </div>
@@ -41,6 +41,9 @@ const Grading = () => {
   const gradedItems = currentItems.filter((i) => i.graded);
   const containerRef = useRef<HTMLDivElement | null>(null);
   const itemRefs = useRef<Record<number, HTMLDivElement | null>>({});
+  // Items whose canvas has been mounted; canvases mount once scrolled near and stay mounted
+  const [mountedItemIds, setMountedItemIds] = useState<Set<number>>(new Set());
+  const gradedIdsKey = gradedItems.map((i) => i.item_id).join(",");
 
   useEffect(() => {
     if (!submissionId) return;
@@ -97,6 +100,27 @@ const Grading = () => {
     return () => root.removeEventListener("scroll", handler as any);
   }, [computeActiveItem]);
 
+  // Defer each item's canvas (detail fetch + page images) until its card nears the viewport
+  useEffect(() => {
+    const root = containerRef.current;
+    if (!root || !gradedIdsKey) return;
+    const observer = new IntersectionObserver((entries) => {
+      const visible = entries.filter((e) => e.isIntersecting).map((e) => Number((e.target as HTMLElement).dataset.itemId));
+      if (visible.length === 0) return;
+      setMountedItemIds((prev) => {
+        if (visible.every((id) => prev.has(id))) return prev;
+        const next = new Set(prev);
+        visible.forEach((id) => next.add(id));
+        return next;
+      });
+    }, { root, rootMargin: "600px 0px" });
+    for (const id of gradedIdsKey.split(",")) {
+      const el = itemRefs.current[Number(id)];
+      if (el) observer.observe(el);
+    }
+    return () => observer.disconnect();
+  }, [gradedIdsKey]);
+
   // Timer tick while regrading to update duration label
   useEffect(() => {
     if (!regrading) return;
@@ -104,8 +128,29 @@ const Grading = () => {
     return () => clearInterval(id);
   }, [regrading]);
 
-  // WebSocket: detect submission (re)grade completion
+  // Coalesces the summary refetches triggered by a burst of per-item events
+  const summaryRefreshTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const refreshSummary = useCallback(() => {
+    if (summaryRefreshTimer.current) {
+      clearTimeout(summaryRefreshTimer.current);
+      summaryRefreshTimer.current = null;
+    }
+    gradingSummary(submissionId).then((sum) => setSummary(sum as any)).catch(() => {});
+  }, [submissionId]);
+  useEffect(() => () => {
+    if (summaryRefreshTimer.current) clearTimeout(summaryRefreshTimer.current);
+  }, []);
+
+  // WebSocket: per-item progress during a regrade, then submission (re)grade completion.
+  // Notifications go to every client, so only react to this page's submission.
   useWebSocket((msg) => {
+    if (msg.submission_id !== submissionId) return;
+    if (msg.event === "GRADE_ITEM") {
+      if (!summaryRefreshTimer.current) {
+        summaryRefreshTimer.current = setTimeout(refreshSummary, 500);
+      }
+      return;
+    }
     if (
       (msg.event === "GRADE_SUBMISSION" || msg.event === "RE_GRADE_SUBMISSION" || msg.event === "REGRADE_SUBMISSION") &&
       msg.status === "succeeded"
@@ -114,7 +159,7 @@ const Grading = () => {
       setRegradeStartAt(null);
       setRecentlyRegraded(true);
       setTimeout(() => setRecentlyRegraded(false), 6000);
-      gradingSummary(submissionId).then((sum) => setSummary(sum as any)).catch(() => {});
+      refreshSummary();
     }
   });
 
@@ -232,6 +277,7 @@ const Grading = () => {
               <div
                 key={it.item_id}
                 ref={(el) => { itemRefs.current[it.item_id] = el; }}
+                data-item-id={it.item_id}
                 className={`rounded-lg border ${activeItemId === it.item_id ? "border-primary" : "border-border"}`}
               >
                 <div className="flex items-center justify-between px-3 py-2 border-b">
@@ -241,11 +287,17 @@ const Grading = () => {
                   </Badge>
                 </div>
                 <div className="p-2">
-                  <ItemAnnotationCanvas
-                    itemId={it.item_id}
-                    onSaved={handleAnnotationsSaved}
-                    onVisiblePageChange={(idx) => setActivePageIndexByItem((prev) => ({ ...prev, [it.item_id]: idx }))}
-                  />
+                  {mountedItemIds.has(it.item_id) ? (
+                    <ItemAnnotationCanvas
+                      itemId={it.item_id}
+                      onSaved={handleAnnotationsSaved}
+                      onVisiblePageChange={(idx) => setActivePageIndexByItem((prev) => ({ ...prev, [it.item_id]: idx }))}
+                    />
+                  ) : (
+                    <div className="h-[480px] flex items-center justify-center text-xs text-muted-foreground">
+                      <Loader2 className="h-4 w-4 mr-2 animate-spin" /> Loading…
+                    </div>
+                  )}
                 </div>
               </div>
             ))
@@ -11,17 +11,105 @@ import { toast } from "sonner";
 import { createSubmission, listExams, listSubmissions, uploadSubmissionFiles } from "@/lib/api";
 import type { Exam, Submission } from "@/lib/types";
 
+// Owns the upload form state, so typing in the dialog re-renders only the dialog
+// and not every submission card on the page.
+const UploadSubmissionDialog = ({ exams, defaultExamId, onUploaded }: {
+  exams: Exam[];
+  defaultExamId: string;
+  onUploaded: () => Promise<void>;
+}) => {
+  const [studentName, setStudentName] = useState("");
+  const [dialogOpen, setDialogOpen] = useState(false);
+  const [examId, setExamId] = useState<string>(defaultExamId);
+  const [uploading, setUploading] = useState(false);
+
+  const handleUpload = async (files: FileList | null) => {
+    if (!files || !studentName || !examId) {
+      toast.error("Please select exam, enter student name and choose files");
+      return;
+    }
+    try {
+      setUploading(true);
+      const submission = await createSubmission({ exam: Number(examId), student_name: studentName });
+      await uploadSubmissionFiles(submission.id, Array.from(files));
+      toast.success(`Uploaded ${files.length} files for ${studentName}. Upscaling will start automatically.`);
+      setDialogOpen(false);
+      setStudentName("");
+      setExamId("");
+      await onUploaded();
+    } catch (e: any) {
+      toast.error(e?.message || "Upload failed");
+    } finally {
+      setUploading(false);
+    }
+  };
+
+  return (
+    <Dialog open={dialogOpen} onOpenChange={setDialogOpen}>
+      <DialogTrigger asChild>
+        <Button className="gap-2">
+          <Upload className="h-4 w-4" />
+          Upload Submission
+        </Button>
+      </DialogTrigger>
+      <DialogContent>
+        <DialogHeader>
+          <DialogTitle>Upload Student Submission</DialogTitle>
+          <DialogDescription>
+            Select an exam, enter the student name, and upload their submission images.
+          </DialogDescription>
+        </DialogHeader>
+        <div className="space-y-4 pt-4">
+          <div>
+            <label className="text-sm font-medium">Exam</label>
+            <Select value={examId} onValueChange={setExamId}>
+              <SelectTrigger className="mt-2">
+                <SelectValue placeholder="Select exam" />
+              </SelectTrigger>
+              <SelectContent>
+                {exams.map((ex) => (
+                  <SelectItem key={ex.id} value={String(ex.id)}>
+                    {ex.name} (#{ex.id})
+                  </SelectItem>
+                ))}
+              </SelectContent>
+            </Select>
+          </div>
+          <div>
+            <label className="text-sm font-medium">Student Name</label>
+            <Input
+              placeholder="Enter student name"
+              value={studentName}
+              onChange={(e) => setStudentName(e.target.value)}
+              className="mt-2"
+            />
+          </div>
+          <div>
+            <label className="text-sm font-medium">Upload Images/PDF</label>
+            <Input
+              type="file"
+              multiple
+              accept="image/*,.pdf,application/pdf"
+              onChange={(e) => handleUpload(e.target.files)}
+              className="mt-2"
+            />
+          </div>
+          {uploading && (
+            <div className="text-xs text-muted-foreground">Uploading…</div>
+          )}
+        </div>
+      </DialogContent>
+    </Dialog>
+  );
+};
+
 const Submissions = () => {
   const [sp] = useSearchParams();
   const filterExamId = sp.get("examId");
   
-  const [studentName, setStudentName] = useState("");
-  const [dialogOpen, setDialogOpen] = useState(false);
   const [exams, setExams] = useState<Exam[]>([]);
   const [submissions, setSubmissions] = useState<Submission[]>([]);
-  const [examId, setExamId] = useState<string>(filterExamId || "");
   const [expandedExamIds, setExpandedExamIds] = useState<Set<number>>(new Set());
-  const [uploading, setUploading] = useState(false);
 
   const loadData = async () => {
     try {
@@ -42,16 +130,18 @@ const Submissions = () => {
     return submissions.filter((s) => s.exam === Number(filterExamId));
   }, [submissions, filterExamId]);
 
+  const examsById = useMemo(() => new Map(exams.map((e) => [e.id, e])), [exams]);
+
   const currentExam = useMemo(() => {
     if (!filterExamId) return null;
-    return exams.find((e) => e.id === Number(filterExamId));
-  }, [exams, filterExamId]);
+    return examsById.get(Number(filterExamId));
+  }, [examsById, filterExamId]);
 
   // Group submissions by exam
   const groups = useMemo(() => {
     const map = new Map<number, { exam: Exam | undefined; items: Submission[] }>();
     for (const s of filteredSubmissions) {
-      if (!map.has(s.exam)) map.set(s.exam, { exam: exams.find((e) => e.id === s.exam), items: [] });
+      if (!map.has(s.exam)) map.set(s.exam, { exam: examsById.get(s.exam), items: [] });
       map.get(s.exam)!.items.push(s);
     }
     // Initialize expanded set: expand selected exam if filter exists; otherwise expand all
@@ -66,7 +156,7 @@ const Submissions = () => {
       const bn = b[1].exam?.name || String(b[0]);
       return an.localeCompare(bn);
     });
-  }, [filteredSubmissions, exams, filterExamId]);
+  }, [filteredSubmissions, examsById, filterExamId]);
 
   const getStatusBadge = (s: Submission) => {
     // MVP: Derive a coarse status from images presence only.
@@ -82,27 +172,6 @@ const Submissions = () => {
     );
   };
 
-  const handleUpload = async (files: FileList | null) => {
-    if (!files || !studentName || !examId) {
-      toast.error("Please select exam, enter student name and choose files");
-      return;
-    }
-    try {
-      setUploading(true);
-      const submission = await createSubmission({ exam: Number(examId), student_name: studentName });
-      await uploadSubmissionFiles(submission.id, Array.from(files));
-      toast.success(`Uploaded ${files.length} files for ${studentName}. Upscaling will start automatically.`);
-      setDialogOpen(false);
-      setStudentName("");
-      setExamId("");
-      await loadData();
-    } catch (e: any) {
-      toast.error(e?.message || "Upload failed");
-    } finally {
-      setUploading(false);
-    }
-  };
-
   // When user clicks grading or crop, also register a sidebar tab
   const addSidebarTab = (type: "grading" | "crop", submissionId: number, examName?: string, studentName?: string) => {
     const key = type === "grading" ? "sidebar:gradingTabs" : "sidebar:cropTabs";
@@ -142,61 +211,7 @@ const Submissions = () => {
             {currentExam && <span className="ml-2 font-medium">for {currentExam.name}</span>}
           </p>
         </div>
-        <Dialog open={dialogOpen} onOpenChange={setDialogOpen}>
-          <DialogTrigger asChild>
-            <Button className="gap-2">
-              <Upload className="h-4 w-4" />
-              Upload Submission
-            </Button>
-          </DialogTrigger>
-          <DialogContent>
-            <DialogHeader>
-              <DialogTitle>Upload Student Submission</DialogTitle>
-              <DialogDescription>
-                Select an exam, enter the student name, and upload their submission images.
-              </DialogDescription>
-            </DialogHeader>
-            <div className="space-y-4 pt-4">
-              <div>
-                <label className="text-sm font-medium">Exam</label>
-                <Select value={examId} onValueChange={setExamId}>
-                  <SelectTrigger className="mt-2">
-                    <SelectValue placeholder="Select exam" />
-                  </SelectTrigger>
-                  <SelectContent>
-                    {exams.map((ex) => (
-                      <SelectItem key={ex.id} value={String(ex.id)}>
-                        {ex.name} (#{ex.id})
-                      </SelectItem>
-                    ))}
-                  </SelectContent>
-                </Select>
-              </div>
-              <div>
-                <label className="text-sm font-medium">Student Name</label>
-                <Input
-                  placeholder="Enter student name"
-                  value={studentName}
-                  onChange={(e) => setStudentName(e.target.value)}
-                  className="mt-2"
-                />
-              </div>
-              <div>
-                <label className="text-sm font-medium">Upload Images/PDF</label>
-                <Input
-                  type="file"
-                  multiple
-                  accept="image/*,.pdf,application/pdf"
-                  onChange={(e) => handleUpload(e.target.files)}
-                  className="mt-2"
-                />
-              </div>
-              {uploading && (
-                <div className="text-xs text-muted-foreground">Uploading…</div>
-              )}
-            </div>
-          </DialogContent>
-        </Dialog>
+        <UploadSubmissionDialog exams={exams} defaultExamId={filterExamId || ""} onUploaded={loadData} />
       </div>
 
       <div className="space-y-4">
@@ -1,14 +1,30 @@
+import hashlib
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple, List, Union
+from typing import Dict, Iterable, List, Set, Tuple, Union
 import unicodedata
 
 from django.conf import settings
+from django.core.files.move import file_move_safe
 from django.core.files.uploadedfile import UploadedFile
 from PIL import Image
 from pdf2image import convert_from_path
 
+from .image_ops import ensure_thumbnail, thumbnail_is_current, thumbnail_path
+
+# Upper bound on threads used to build missing preview thumbnails
+THUMBNAIL_WORKERS = 8
+# pdftoppm processes used to rasterize one PDF (pages are split between them)
+PDF_RENDER_THREADS = min(4, os.cpu_count() or 1)
+# Prepared (downscaled/encoded) image payloads kept in memory for repeated model calls, e.g. one
+# question image graded for many students. Raw file bytes are never cached.
+IMAGE_PAYLOAD_CACHE_SIZE = 64
+# Content digests of image file versions; entries are tiny, so many more are kept
+IMAGE_DIGEST_CACHE_SIZE = 4096
+
 
 def _ensure_dir(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
@@ -20,6 +36,23 @@ def _safe_filename(prefix: str, original_name: str) -> str:
     return f"{base}_{uuid.uuid4().hex}{ext}"
 
 
+def _write_upload(upload: UploadedFile, dest: Path) -> None:
+    if hasattr(upload, "temporary_file_path"):
+        # Large upload already streamed to a temp file by Django: move it into place
+        file_move_safe(upload.temporary_file_path(), str(dest))
+        # The temp file was created 0600; give it normal media permissions (as FileSystemStorage does)
+        os.chmod(dest, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        return
+    with dest.open("wb") as f:
+        getbuffer = getattr(upload.file, "getbuffer", None)
+        if getbuffer is not None:
+            # In-memory upload: write the BytesIO buffer as-is (memoryview, no copy)
+            f.write(getbuffer())
+            return
+        for chunk in upload.chunks():
+            f.write(chunk)
+
+
 def validate_image_file(upload: UploadedFile) -> Tuple[bool, str]:
     name = upload.name.lower()
     size_mb = upload.size / (1024 * 1024)
@@ -43,9 +76,7 @@ def save_uploaded_image(upload: UploadedFile, target_dir: Path, prefix: str = ""
     _ensure_dir(target_dir)
     filename = _safe_filename(prefix, upload.name)
     dest = target_dir / filename
-    with dest.open("wb") as f:
-        for chunk in upload.chunks():
-            f.write(chunk)
+    _write_upload(upload, dest)
     # verify image can be opened
     Image.open(dest).verify()
     return dest
@@ -55,20 +86,54 @@ def save_uploaded_pdf(upload: UploadedFile, target_dir: Path, prefix: str = "",
     _ensure_dir(target_dir)
     filename = _safe_filename(prefix or "document", upload.name)
     pdf_path = target_dir / filename
-    with pdf_path.open("wb") as f:
-        for chunk in upload.chunks():
-            f.write(chunk)
-    # convert to images
-    pages = convert_from_path(str(pdf_path), dpi=dpi)
+    _write_upload(upload, pdf_path)
+    # convert to images: pdftoppm writes the JPEGs itself, so pages are never
+    # decoded into PIL images (and held in memory all at once) on our side
+    rendered = convert_from_path(
+        str(pdf_path),
+        dpi=dpi,
+        output_folder=str(target_dir),
+        output_file=pdf_path.stem,
+        fmt="jpeg",
+        jpegopt={"quality": 95},
+        paths_only=True,
+        thread_count=PDF_RENDER_THREADS,
+    )
     image_paths: List[Path] = []
-    for idx, page in enumerate(pages, 1):
-        img_name = f"{pdf_path.stem}_p{idx:03d}.jpg"
-        img_path = target_dir / img_name
-        page.save(str(img_path), "JPEG", quality=95)
+    for idx, rendered_path in enumerate(rendered, 1):
+        img_path = target_dir / f"{pdf_path.stem}_p{idx:03d}.jpg"
+        os.replace(rendered_path, img_path)
         image_paths.append(img_path)
     return image_paths
 
 
+def _is_pdf(upload: UploadedFile) -> bool:
+    return upload.name.lower().endswith(".pdf")
+
+
+def validate_uploaded_files(uploads: List[UploadedFile]) -> Tuple[bool, str]:
+    """Validate a batch of image/PDF uploads; stops at the first invalid file.
+
+    Call before save_uploaded_files so a bad file doesn't leave earlier ones orphaned on disk.
+    """
+    for upload in uploads:
+        ok, msg = validate_pdf_file(upload) if _is_pdf(upload) else validate_image_file(upload)
+        if not ok:
+            return False, msg
+    return True, "ok"
+
+
+def save_uploaded_files(uploads: List[UploadedFile], target_dir: Path, prefix: str = "") -> List[str]:
+    """Save a batch of validated uploads; PDFs are expanded into one image per page."""
+    saved_paths: List[str] = []
+    for upload in uploads:
+        if _is_pdf(upload):
+            saved_paths.extend(str(p) for p in save_uploaded_pdf(upload, target_dir, prefix=prefix))
+        else:
+            saved_paths.append(str(save_uploaded_image(upload, target_dir, prefix=prefix)))
+    return saved_paths
+
+
 def delete_image_file(image_path: Union[str, Path]) -> bool:
     """
     Delete an image file from disk.
@@ -78,6 +143,7 @@ def delete_image_file(image_path: Union[str, Path]) -> bool:
         path = Path(image_path)
         if path.exists() and path.is_file():
             path.unlink()
+            thumbnail_path(path).unlink(missing_ok=True)
             return True
         return False
     except Exception as e:
@@ -122,3 +188,104 @@ def normalized_path_exists(path_like: Union[str, Path]) -> bool:
     return False
 
 
+def _listdir_nfc(directory: str) -> Set[str]:
+    """NFC-normalized entry names of a directory (trying NFC/NFD spellings of its path)."""
+    for candidate in _normalize_path_variants(directory):
+        try:
+            return {unicodedata.normalize("NFC", name) for name in os.listdir(candidate)}
+        except OSError:
+            continue
+    return set()
+
+
+def existing_path_set(paths: Iterable[Union[str, Path]]) -> Set[str]:
+    """Subset of ``paths`` (as strings) that exist, with one directory listing per parent dir.
+
+    Same NFC/NFD tolerance as ``normalized_path_exists``, but for many files in few
+    folders this replaces a stat (or two) per path with a single listdir per folder.
+    """
+    by_dir: Dict[str, List[str]] = {}
+    for p in paths:
+        sp = str(p)
+        by_dir.setdefault(os.path.dirname(unicodedata.normalize("NFC", sp)), []).append(sp)
+    found: Set[str] = set()
+    for directory, members in by_dir.items():
+        names = _listdir_nfc(directory)
+        for sp in members:
+            if unicodedata.normalize("NFC", os.path.basename(sp)) in names:
+                found.add(sp)
+    return found
+
+
+@lru_cache(maxsize=IMAGE_DIGEST_CACHE_SIZE)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def image_digest(path_like: Union[str, Path]) -> str:
+    """sha256 hex of an image file, memoized on (path, mtime, size).
+
+    Lets callers look up a prepared payload by content without reading the file. Raises
+    FileNotFoundError (from os.stat) if the file is missing.
+    """
+    path = str(path_like)
+    st = os.stat(path)
+    return _file_digest(path, st.st_mtime_ns, st.st_size)
+
+
+def read_image(path_like: Union[str, Path]) -> Tuple[bytes, str]:
+    """(contents, sha256 hex) of an image file.
+
+    Not cached: callers keep only the payload they build from the bytes.
+    """
+    with open(str(path_like), "rb") as f:
+        data = f.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+# --- Media URL helpers ---
+def media_url(request, path_like: Union[str, Path]) -> str:
+    """Map a file under MEDIA_ROOT to its media URL (absolute when a request is given)."""
+    sp = str(path_like)
+    normalized_path = unicodedata.normalize("NFC", sp)
+    normalized_media_root = unicodedata.normalize("NFC", str(settings.MEDIA_ROOT))
+    if not normalized_path.startswith(normalized_media_root):
+        # fallback: return as-is; browser may still access if served
+        return sp
+    rel = normalized_path[len(normalized_media_root):].lstrip("/")
+    url = f"{settings.MEDIA_URL.rstrip('/')}/{rel}"
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def _try_thumbnail(image_path: Union[str, Path]) -> None:
+    try:
+        ensure_thumbnail(image_path)
+    except Exception:
+        pass
+
+
+def build_missing_thumbnails(image_paths: Iterable[Union[str, Path]]) -> None:
+    """Build absent/stale thumbnails with one thread pool (Pillow releases the GIL while decoding).
+
+    Listing views pass every item's paths at once, so the pool is created once per request.
+    """
+    missing = [p for p in dict.fromkeys(image_paths) if not thumbnail_is_current(p)]
+    if len(missing) > 1:
+        with ThreadPoolExecutor(max_workers=min(THUMBNAIL_WORKERS, len(missing))) as executor:
+            list(executor.map(_try_thumbnail, missing))
+
+
+def thumbnail_urls(request, image_paths: List[Union[str, Path]]) -> List[str]:
+    """Preview-sized URLs for the given images, falling back to the original on failure."""
+    build_missing_thumbnails(image_paths)
+    urls = []
+    for p in image_paths:
+        try:
+            urls.append(media_url(request, ensure_thumbnail(p)))
+        except Exception:
+            urls.append(media_url(request, p))
+    return urls
@@ -1,8 +1,15 @@
+import io
+import os
+import uuid
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Tuple, Union
 from PIL import Image
 
 
+# Longest edge of the preview tiles shown next to questions/answers
+THUMBNAIL_SIZE: Tuple[int, int] = (400, 400)
+
+
 def crop_bbox(image_path: Path, bbox: Dict) -> Image.Image:
     """Crop an image by bbox.
 
@@ -65,4 +72,65 @@ def crop_bbox(image_path: Path, bbox: Dict) -> Image.Image:
     return cropped
 
 
+def thumbnail_path(image_path: Union[str, Path]) -> Path:
+    """Location of the preview thumbnail for an image (a ``thumbs/`` sibling folder)."""
+    src = Path(image_path)
+    return src.parent / "thumbs" / f"{src.stem}.jpg"
+
+
+def thumbnail_is_current(image_path: Union[str, Path]) -> bool:
+    """True if the image has a thumbnail at least as new as the image itself."""
+    try:
+        return thumbnail_path(image_path).stat().st_mtime >= Path(image_path).stat().st_mtime
+    except OSError:
+        return False
+
+
+def ensure_thumbnail(image_path: Union[str, Path], size: Tuple[int, int] = THUMBNAIL_SIZE) -> Path:
+    """Return a downscaled JPEG copy of the image for preview tiles.
+
+    The thumbnail is created on first use and reused afterwards, so preview
+    grids ship a few KB per tile instead of the full-resolution crop. Reuse is
+    keyed on the path plus file mtimes (two stat calls), never on the image
+    bytes, so an image replaced in place gets a fresh thumbnail.
+    """
+    dest = thumbnail_path(image_path)
+    if thumbnail_is_current(image_path):
+        return dest
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    # Write beside the target and swap in, so concurrent requests never serve a half-written file
+    tmp = dest.with_name(f"{dest.stem}.{uuid.uuid4().hex}.tmp")
+    try:
+        with Image.open(image_path) as img:
+            # JPEG only: let libjpeg decode at 1/2..1/8 scale, no smaller than the target.
+            # thumbnail() alone drafts to 2x the target, decoding ~4x more pixels.
+            img.draft("RGB", size)
+            img.thumbnail(size, Image.BILINEAR)
+            thumb = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+            thumb.save(tmp, "JPEG", quality=85)
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return dest
+
+
+def shrink_image_bytes(data: bytes, max_dim: int, quality: int = 85) -> Optional[bytes]:
+    """JPEG re-encode of an encoded image scaled so its longest edge is max_dim.
+
+    Returns None when the image already fits, so callers keep the original bytes.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        if max(img.size) <= max_dim:
+            return None
+        img.draft("RGB", (max_dim, max_dim))
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        out = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+        buf = io.BytesIO()
+        out.save(buf, "JPEG", quality=quality, optimize=True)
+        return buf.getvalue()
+
 
+def image_dimensions(data: bytes) -> Tuple[int, int]:
+    """(width, height) of an encoded image; only the header is decoded."""
+    with Image.open(io.BytesIO(data)) as img:
+        return img.size
@@ -27,8 +27,12 @@ class Question(models.Model):
     solution_verified = models.BooleanField(default=False)
     solution_generated_at = models.DateTimeField(null=True, blank=True)
 
+    @property
+    def label(self) -> str:
+        """Display label such as '1a'."""
+        return f"{self.order_index}{self.part_label or ''}"
+
     def __str__(self) -> str:
-        label = f"{self.order_index}{self.part_label or ''}"
-        return f"Question {label} of {self.exam_id}"
+        return f"Question {self.label} of {self.exam_id}"
 
 
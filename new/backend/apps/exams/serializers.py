@@ -1,6 +1,5 @@
 from rest_framework import serializers
 from .models import Exam, Question
-from apps.common.labels import parse_question_label, format_question_label
 
 
 class ExamSerializer(serializers.ModelSerializer):
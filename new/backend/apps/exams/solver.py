@@ -1,21 +1,30 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
 import re
 import os
 import logging
 import uuid
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 
+import httpx
 from django.conf import settings
-from apps.common.files import normalized_path_exists
+from django.core.cache import caches
+from apps.common.files import IMAGE_PAYLOAD_CACHE_SIZE, normalized_path_exists, read_image
+from apps.common.image_ops import image_dimensions, shrink_image_bytes
+import openai
 from openai import OpenAI
 
 logger = logging.getLogger("grading")
 
+# Django cache alias holding generated solutions, keyed by a hash of model, prompts and image contents
+SOLVER_CACHE_ALIAS = "solver"
+
 MATH_SOLVING_PROMPT = """
 Bạn là một giáo viên Toán Việt Nam xuất sắc với 20 năm kinh nghiệm, chuyên gia trong việc giải toán step-by-step một cách chi tiết và dễ hiểu.
 
@@ -89,14 +98,64 @@ Bạn phải trả về một đối tượng JSON duy nhất với cấu trúc
 """
 
 
-def _encode_image(image_path: str) -> str:
-	with open(image_path, "rb") as f:
-		return base64.b64encode(f.read()).decode("utf-8")
+_IMAGE_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+# An image whose longest edge fits in one 512px tile carries the same pixels at "low" detail
+# (85 tokens) as at "high" (85 + 170 per tile), so it is sent at low detail
+LOW_DETAIL_MAX_DIM = 512
+
+# Fixed text ahead of the images. Together with MATH_SOLVING_PROMPT it forms a byte-identical
+# prefix on every call, which OpenAI's automatic prompt caching can reuse (keep per-call data out of it).
+SOLVE_INSTRUCTION = "Hãy giải bài toán trong ảnh theo format JSON. LƯU Ý: Không dùng LaTeX, hãy dùng văn bản/Unicode dễ đọc cho công thức."
+
+# Built once and shared by every call (never mutated): the system message and the text part
+# that opens the user message
+_SYSTEM_MESSAGE: Dict[str, Any] = {"role": "system", "content": MATH_SOLVING_PROMPT}
+_INSTRUCTION_PART: Dict[str, Any] = {"type": "text", "text": SOLVE_INSTRUCTION}
+
+# LaTeX command -> Unicode replacements, applied in order
+_LATEX_TOKENS = {
+	"\\times": "×",
+	"\\cdot": "·",
+	"\\pm": "±",
+	"\\le": "≤",
+	"\\ge": "≥",
+	"\\neq": "≠",
+	"\\approx": "≈",
+	"\\infty": "∞",
+	"\\sqrt": "√",
+	"\\Delta": "Δ",
+	"\\delta": "δ",
+	"\\alpha": "α",
+	"\\beta": "β",
+	"\\gamma": "γ",
+	"\\pi": "π",
+}
 
 
 def _get_mime(path: str) -> str:
 	ext = Path(path).suffix.lower()
-	return {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}.get(ext, "image/jpeg")
+	return _IMAGE_MIME_TYPES.get(ext, "image/jpeg")
+
+
+@lru_cache(maxsize=IMAGE_PAYLOAD_CACHE_SIZE)
+def _data_url(path: str, mtime_ns: int, size: int, max_dim: int) -> Tuple[str, str, str]:
+	# Only the finished (downscaled, base64) URL is kept; the raw bytes are dropped after this.
+	# base64 output is pure ASCII; built once per file version instead of on every solve
+	data, digest = read_image(path)
+	mime = _get_mime(path)
+	if max_dim:
+		smaller = shrink_image_bytes(data, max_dim)
+		if smaller is not None:
+			data, mime = smaller, "image/jpeg"
+	detail = "low" if max(image_dimensions(data)) <= LOW_DETAIL_MAX_DIM else "high"
+	return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}", digest, detail
+
+
+def _image_data_url(path: str, max_dim: int) -> Tuple[str, str, str]:
+	"""(data URL, sha256 hex of the file, detail level) of an image, memoized on (path, mtime, size)."""
+	st = os.stat(path)
+	return _data_url(str(path), st.st_mtime_ns, st.st_size, max_dim)
 
 
 def _latex_like_to_unicode(text: str | None) -> str | None:
@@ -118,24 +177,7 @@ def _latex_like_to_unicode(text: str | None) -> str | None:
 	result = result.replace("{", "(").replace("}", ")")
 
 	# Token mappings
-	mapping = {
-		"\\times": "×",
-		"\\cdot": "·",
-		"\\pm": "±",
-		"\\le": "≤",
-		"\\ge": "≥",
-		"\\neq": "≠",
-		"\\approx": "≈",
-		"\\infty": "∞",
-		"\\sqrt": "√",
-		"\\Delta": "Δ",
-		"\\delta": "δ",
-		"\\alpha": "α",
-		"\\beta": "β",
-		"\\gamma": "γ",
-		"\\pi": "π",
-	}
-	for k, v in mapping.items():
+	for k, v in _LATEX_TOKENS.items():
 		result = result.replace(k, v)
 
 	# Simple fractions: \frac{a}{b} -> (a)/(b)
@@ -148,40 +190,94 @@ def _latex_like_to_unicode(text: str | None) -> str | None:
 	result = re.sub(r"\s+", " ", result).strip()
 	return result
 
-def solve_question(question_image_paths: List[str]) -> Dict[str, Any]:
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+	"""Process-wide OpenAI client, so its HTTP connection pool is reused across solves."""
+	api_key = getattr(settings, "OPENAI_API_KEY", None)
+	if not api_key:
+		raise RuntimeError("OPENAI_API_KEY is not configured")
+	# Per-attempt limit (the SDK default is 10 minutes); the view holds a worker meanwhile
+	timeout = httpx.Timeout(float(getattr(settings, "OPENAI_TIMEOUT_SECONDS", 120)), connect=10.0)
+	# The SDK retries 429/5xx/timeouts/connection errors itself, with exponential backoff and jitter,
+	# so a solve can take up to (max_retries + 1) timeouts before the fallback's single attempt
+	max_retries = int(getattr(settings, "OPENAI_MAX_RETRIES", 3))
+	return OpenAI(api_key=api_key, timeout=timeout, max_retries=max_retries)
+
+
+# Failures that survive the SDK's own retries but may not recur on another model
+_TRANSIENT_ERRORS = (
+	openai.RateLimitError,
+	openai.APITimeoutError,
+	openai.APIConnectionError,
+	openai.InternalServerError,
+)
+
+
+def _create_completion(run_id: str, model_name: str, messages: List[Dict[str, Any]]):
+	"""(response, model used): the primary model, then OPENAI_SOLVER_FALLBACK_MODEL on a transient failure."""
+	client = get_openai_client()
+	try:
+		return client.chat.completions.create(
+			model=model_name,
+			messages=messages,
+			response_format={"type": "json_object"},
+		), model_name
+	except _TRANSIENT_ERRORS as e:
+		fallback = os.getenv("OPENAI_SOLVER_FALLBACK_MODEL", "")
+		if not fallback or fallback == model_name:
+			raise
+		logger.warning("run=%s model=%s failed after retries (%s), falling back to %s", run_id, model_name, type(e).__name__, fallback)
+		# The primary already spent its retries; give the fallback one attempt so the view isn't held for another round
+		return client.with_options(max_retries=0).chat.completions.create(
+			model=fallback,
+			messages=messages,
+			response_format={"type": "json_object"},
+		), fallback
+
+
+def solve_question(question_image_paths: List[str], use_cache: bool = True) -> Dict[str, Any]:
+	"""Solve the question in the given images.
+
+	With use_cache, a solution stored for the same model, prompts and image bytes is returned
+	without calling the model; fresh solutions are always stored for later lookups.
+	"""
 	run_id = str(uuid.uuid4())
 	model_name = os.getenv("OPENAI_SOLVER_MODEL", "gpt-4o-mini")
 	
 	logger.debug("run=%s start solve_question model=%s image_count=%d", run_id, model_name, len(question_image_paths))
 	
-	api_key = getattr(settings, "OPENAI_API_KEY", None)
-	if not api_key:
-		raise RuntimeError("OPENAI_API_KEY is not configured")
-	client = OpenAI(api_key=api_key)
-
-	messages: List[Dict[str, Any]] = [
-		{"role": "system", "content": MATH_SOLVING_PROMPT},
-		{"role": "user", "content": [{"type": "text", "text": "Hãy giải bài toán trong ảnh theo format JSON. LƯU Ý: Không dùng LaTeX, hãy dùng văn bản/Unicode dễ đọc cho công thức."}]},
-	]
+	content: List[Dict[str, Any]] = [_INSTRUCTION_PART]
+	max_dim = int(getattr(settings, "OPENAI_MAX_IMAGE_DIM", 0) or 0)
+	request_hash = hashlib.sha256()
+	for part in (model_name, str(max_dim), MATH_SOLVING_PROMPT, SOLVE_INSTRUCTION):
+		request_hash.update(part.encode("utf-8"))
+		request_hash.update(b"\0")
 
 	# attach images
 	for p in question_image_paths:
 		if not normalized_path_exists(p):
 			raise FileNotFoundError(f"Question image not found: {p}")
-		b64 = _encode_image(p)
-		mime = _get_mime(p)
-		messages[1]["content"].append({
+		url, digest, detail = _image_data_url(p, max_dim)
+		request_hash.update(digest.encode("ascii"))
+		content.append({
 			"type": "image_url",
-			"image_url": {"url": f"data:{mime};base64,{b64}", "detail": "high"}
+			"image_url": {"url": url, "detail": detail}
 		})
 
 	logger.debug("run=%s image_paths=%s", run_id, [str(p) for p in question_image_paths])
 
-	resp = client.chat.completions.create(
-		model=model_name,
-		messages=messages,
-		response_format={"type": "json_object"},
-	)
+	cache_key = None
+	if getattr(settings, "SOLVER_CACHE_ENABLED", False):
+		cache_key = f"solve:{request_hash.hexdigest()}"
+		if use_cache:
+			cached = caches[SOLVER_CACHE_ALIAS].get(cache_key)
+			if cached is not None:
+				logger.debug("run=%s cache_hit key=%s", run_id, cache_key)
+				# The entry may be days old or from another question with the same crop
+				return {**cached, "generated_at": datetime.now(timezone.utc).isoformat()}
+
+	messages: List[Dict[str, Any]] = [_SYSTEM_MESSAGE, {"role": "user", "content": content}]
+	resp, used_model = _create_completion(run_id, model_name, messages)
 
 	# Extract token usage
 	usage = resp.usage
@@ -189,16 +285,19 @@ def solve_question(question_image_paths: List[str]) -> Dict[str, Any]:
 		prompt_tokens = usage.prompt_tokens
 		completion_tokens = usage.completion_tokens
 		total_tokens = usage.total_tokens
+		# Prompt-prefix cache hits (system prompt + fixed instruction); billed at half price
+		details = getattr(usage, "prompt_tokens_details", None)
+		cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
 		
-		# GPT-4o-mini pricing: $0.150 per 1M input tokens, $0.600 per 1M output tokens
+		# GPT-4o-mini pricing: $0.150 per 1M input tokens ($0.075 cached), $0.600 per 1M output tokens
 		# Adjust if using different model
-		input_cost = (prompt_tokens / 1_000_000) * 0.150
+		input_cost = ((prompt_tokens - cached_tokens) / 1_000_000) * 0.150 + (cached_tokens / 1_000_000) * 0.075
 		output_cost = (completion_tokens / 1_000_000) * 0.600
 		total_cost = input_cost + output_cost
 		
 		logger.info(
-			"run=%s USAGE model=%s prompt_tokens=%d completion_tokens=%d total_tokens=%d input_cost=$%.6f output_cost=$%.6f total_cost=$%.6f",
-			run_id, model_name, prompt_tokens, completion_tokens, total_tokens,
+			"run=%s USAGE model=%s prompt_tokens=%d cached_tokens=%d completion_tokens=%d total_tokens=%d input_cost=$%.6f output_cost=$%.6f total_cost=$%.6f",
+			run_id, used_model, prompt_tokens, cached_tokens, completion_tokens, total_tokens,
 			input_cost, output_cost, total_cost
 		)
 	else:
@@ -218,12 +317,19 @@ def solve_question(question_image_paths: List[str]) -> Dict[str, Any]:
 		item["description"] = _latex_like_to_unicode(item.get("description"))
 		item["content"] = _latex_like_to_unicode(item.get("content"))
 		steps.append(item)
-	total_points = data.get("total_points", sum(s.get("points", 0) for s in steps))
-	return {
+	total_points = data.get("total_points")
+	if total_points is None:
+		# Only fall back to summing the steps when the model left the total out
+		total_points = sum(s.get("points", 0) for s in steps)
+	solution = {
 		"answer": answer,
 		"steps": steps,
 		"total_points": total_points,
 		"generated_at": datetime.now(timezone.utc).isoformat(),
 	}
+	# A fallback model's answer isn't what the key describes; let the next solve try the primary again
+	if cache_key and used_model == model_name:
+		caches[SOLVER_CACHE_ALIAS].set(cache_key, solution)
+	return solution
 
 
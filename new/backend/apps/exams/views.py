@@ -1,18 +1,19 @@
-from typing import List
+import uuid
 
 from django.conf import settings
+from django.db import connection
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from apps.common.files import (
-    validate_image_file,
-    validate_pdf_file,
-    save_uploaded_image,
-    save_uploaded_pdf,
+    validate_uploaded_files,
+    save_uploaded_files,
     delete_image_file,
     delete_image_files,
+    media_url,
+    thumbnail_urls,
 )
 from pathlib import Path
 from apps.common.image_ops import crop_bbox
@@ -33,23 +34,12 @@ class ExamViewSet(viewsets.ModelViewSet):
         if not files:
             return Response({"detail": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        saved_paths: List[str] = []
-        target_dir = settings.MEDIA_EXAMS_DIR / f"exam_{exam.id}"
+        ok, msg = validate_uploaded_files(files)
+        if not ok:
+            return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
 
-        for f in files:
-            name = f.name.lower()
-            if name.endswith(".pdf"):
-                ok, msg = validate_pdf_file(f)
-                if not ok:
-                    return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
-                images = save_uploaded_pdf(f, target_dir, prefix=f"exam{exam.id}")
-                saved_paths.extend([str(p) for p in images])
-            else:
-                ok, msg = validate_image_file(f)
-                if not ok:
-                    return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
-                img_path = save_uploaded_image(f, target_dir, prefix=f"exam{exam.id}")
-                saved_paths.append(str(img_path))
+        target_dir = settings.MEDIA_EXAMS_DIR / f"exam_{exam.id}"
+        saved_paths = save_uploaded_files(files, target_dir, prefix=f"exam{exam.id}")
 
         # Merge with existing
         existing = exam.original_image_paths or []
@@ -63,41 +53,58 @@ class ExamViewSet(viewsets.ModelViewSet):
     def images(self, request, pk=None):
         exam = get_object_or_404(Exam, pk=pk)
         paths = exam.original_image_paths or []
-        media_root = str(settings.MEDIA_ROOT)
-        media_url = settings.MEDIA_URL.rstrip("/")
-        urls = []
-        for p in paths:
-            try:
-                sp = str(p)
-                # Handle Unicode normalization issues by normalizing both paths
-                import unicodedata
-                normalized_path = unicodedata.normalize('NFC', sp)
-                normalized_media_root = unicodedata.normalize('NFC', media_root)
-                
-                if normalized_path.startswith(normalized_media_root):
-                    rel = normalized_path[len(normalized_media_root):].lstrip("/")
-                    # Build absolute URL so FE on a different port can load it
-                    urls.append(request.build_absolute_uri(f"{media_url}/{rel}"))
-                else:
-                    # fallback: return as-is; browser may still access if served
-                    urls.append(sp)
-            except Exception:
-                urls.append(p)
+        # Absolute URLs so FE on a different port can load them
+        urls = [media_url(request, p) for p in paths]
         return Response({"count": len(urls), "urls": urls})
 
     @action(detail=True, methods=["get"], url_path="questions")
     def questions(self, request, pk=None):
         exam = get_object_or_404(Exam, pk=pk)
-        qs = Question.objects.filter(exam=exam).order_by("order_index", "part_label")
+        qs = (
+            Question.objects.filter(exam=exam)
+            .order_by("order_index", "part_label")
+            .only(
+                "id", "order_index", "part_label",
+                "solution_answer", "solution_steps", "solution_points",
+                "solution_generated_at", "solution_verified",
+            )
+        )
+        # Solutions ride along so the page doesn't fetch /solution/ once per question
         data = [
             {
                 "id": q.id,
-                "label": f"{q.order_index}{q.part_label or ''}",
+                "label": q.label,
+                "solution": {
+                    "answer": q.solution_answer,
+                    "steps": q.solution_steps,
+                    "points": q.solution_points,
+                    "generated_at": q.solution_generated_at,
+                    "verified": bool(q.solution_verified),
+                } if q.solution_generated_at else None,
             }
             for q in qs
         ]
         return Response({"count": len(data), "items": data})
 
+    @action(detail=True, methods=["post"], url_path="verify-solutions")
+    def verify_solutions(self, request, pk=None):
+        """Set solution_verified on many questions in one UPDATE (all solved ones by default)"""
+        exam = get_object_or_404(Exam, pk=pk)
+        body = request.data or {}
+        verified = body.get("verified")
+        if verified is None:
+            return Response({"detail": "verified is required (true/false)"}, status=status.HTTP_400_BAD_REQUEST)
+        qs = Question.objects.filter(exam=exam, solution_generated_at__isnull=False)
+        question_ids = body.get("question_ids")
+        if question_ids is not None:
+            if not isinstance(question_ids, list) or not all(
+                isinstance(qid, int) and not isinstance(qid, bool) for qid in question_ids
+            ):
+                return Response({"detail": "question_ids must be a list of integers"}, status=status.HTTP_400_BAD_REQUEST)
+            qs = qs.filter(id__in=question_ids)
+        updated = qs.update(solution_verified=bool(verified))
+        return Response({"updated": updated, "verified": bool(verified)})
+
 
 class QuestionViewSet(viewsets.GenericViewSet):
     queryset = Question.objects.all().order_by("exam_id", "order_index", "part_label")
@@ -157,13 +164,23 @@ class QuestionViewSet(viewsets.GenericViewSet):
         paths = question.question_image_paths or []
         if not paths:
             return Response({"detail": "No question images"}, status=status.HTTP_400_BAD_REQUEST)
-        solution = solve_question(paths)
+        # The model call takes tens of seconds; don't sit on a (pooled) DB connection meanwhile.
+        # Django reconnects transparently for the save below.
+        if not connection.in_atomic_block:
+            connection.close()
+        # A question that already has a solution is being re-solved on purpose: skip the cache
+        solution = solve_question(paths, use_cache=not question.solution_steps)
         question.solution_answer = solution.get("answer")
         question.solution_steps = solution.get("steps")
         question.solution_points = [s.get("points", 0) for s in solution.get("steps", [])]
         question.solution_generated_at = solution.get("generated_at")
         question.save(update_fields=["solution_answer", "solution_steps", "solution_points", "solution_generated_at"])
-        return Response(solution)
+        # Same shape as GET /solution/ so the client needn't fetch what it was just sent
+        return Response({
+            **solution,
+            "points": question.solution_points,
+            "verified": bool(question.solution_verified),
+        })
 
     @action(detail=True, methods=["get"], url_path="solution")
     def get_solution(self, request, pk=None):
@@ -192,26 +209,11 @@ class QuestionViewSet(viewsets.GenericViewSet):
         """Get all question image URLs"""
         question = get_object_or_404(Question, pk=pk)
         paths = question.question_image_paths or []
-        media_root = str(settings.MEDIA_ROOT)
-        media_url = settings.MEDIA_URL.rstrip("/")
-        urls = []
-        for p in paths:
-            try:
-                sp = str(p)
-                import unicodedata
-                normalized_path = unicodedata.normalize('NFC', sp)
-                normalized_media_root = unicodedata.normalize('NFC', media_root)
-                
-                if normalized_path.startswith(normalized_media_root):
-                    rel = normalized_path[len(normalized_media_root):].lstrip("/")
-                    urls.append(request.build_absolute_uri(f"{media_url}/{rel}"))
-                else:
-                    urls.append(sp)
-            except Exception:
-                urls.append(p)
+        urls = [media_url(request, p) for p in paths]
         return Response({
             "count": len(urls),
             "urls": urls,
+            "thumbnail_urls": thumbnail_urls(request, paths),
             "has_multiple": question.has_multiple_images
         })
 
@@ -278,7 +280,6 @@ class QuestionViewSet(viewsets.GenericViewSet):
         # Save with unique filename
         q_dir = settings.MEDIA_QUESTIONS_DIR / f"exam_{exam.id}"
         q_dir.mkdir(parents=True, exist_ok=True)
-        import uuid
         filename = f"q_{question.order_index}{question.part_label or ''}_{uuid.uuid4().hex[:8]}.jpg"
         out_path = q_dir / filename
         cropped.save(out_path, "JPEG", quality=95)
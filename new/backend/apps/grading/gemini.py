@@ -1,16 +1,157 @@
+import hashlib
 import json
-import os
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from django.conf import settings
-import logging
-import uuid
+from django.core.cache import caches
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
 
+from apps.common.files import IMAGE_PAYLOAD_CACHE_SIZE, image_digest, read_image
+from apps.common.image_ops import shrink_image_bytes
 from .prompts import GEMINI_VISION_GRADING_PROMPT
 
+IMAGE_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+# Django cache alias holding graded results, keyed by a hash of everything sent to the model
+GRADING_CACHE_ALIAS = "grading"
+
+
+# Image Parts by (content digest, mime type, max edge), shared across calls and worker threads;
+# a question image graded for many students is read, downscaled and wrapped once. Only these
+# final parts are cached, not the raw file bytes.
+_PART_CACHE: "OrderedDict[Tuple[str, str, int], types.Part]" = OrderedDict()
+_PART_CACHE_LOCK = threading.Lock()
+
+
+def _image_part(path: str, digest: str, mime_type: str, max_dim: int = 0) -> types.Part:
+    key = (digest, mime_type, max_dim)
+    with _PART_CACHE_LOCK:
+        part = _PART_CACHE.get(key)
+        if part is not None:
+            _PART_CACHE.move_to_end(key)
+            return part
+    data, _digest = read_image(path)
+    if max_dim:
+        # Oversized photos cost upload time and tiles without helping the grade
+        smaller = shrink_image_bytes(data, max_dim)
+        if smaller is not None:
+            data, mime_type = smaller, "image/jpeg"
+    part = types.Part.from_bytes(data=data, mime_type=mime_type)
+    with _PART_CACHE_LOCK:
+        _PART_CACHE[key] = part
+        while len(_PART_CACHE) > IMAGE_PAYLOAD_CACHE_SIZE:
+            _PART_CACHE.popitem(last=False)
+    return part
+
+
+# Cache keys currently being graded, so concurrent identical requests share one model call
+_INFLIGHT: Dict[str, threading.Event] = {}
+_INFLIGHT_LOCK = threading.Lock()
+# Upper bound on waiting for another thread's identical call before making our own
+INFLIGHT_WAIT_SECONDS = 300
+
+# Markdown code fences occasionally wrapped around the JSON despite response_mime_type
+_JSON_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def _salvage_json(text: str) -> Optional[Any]:
+    """Parse a response that is JSON wrapped in code fences or stray prose; None if nothing parses."""
+    try:
+        return json.loads(_JSON_FENCE_RE.sub("", text))
+    except json.JSONDecodeError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+# HTTP statuses worth retrying: quota (429) and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 503}
+# Upper bound on a server-suggested wait before retrying a 429
+MAX_RETRY_DELAY_SECONDS = 60.0
+
+
+def _retry_delay_hint(e: "genai_errors.APIError") -> Optional[float]:
+    """Seconds the API asked us to wait (RetryInfo.retryDelay or Retry-After), if it said."""
+    body = e.details if isinstance(e.details, dict) else {}
+    error = body.get("error", body)
+    if not isinstance(error, dict):
+        error = {}
+    for detail in error.get("details") or []:
+        if isinstance(detail, dict) and str(detail.get("@type", "")).endswith("RetryInfo"):
+            m = re.fullmatch(r"(\d+(?:\.\d+)?)s", str(detail.get("retryDelay", "")))
+            if m:
+                return min(float(m.group(1)), MAX_RETRY_DELAY_SECONDS)
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), MAX_RETRY_DELAY_SECONDS)
+    except (TypeError, ValueError):
+        return None
+
+
+class _RateLimiter:
+    """Spaces acquisitions evenly so at most per_minute happen per minute (0 disables). Thread-safe."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval and time.monotonic() >= self._next_at:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def defer(self, seconds: float) -> None:
+        """Hold every caller back for at least `seconds` (e.g. after a 429), even when unlimited."""
+        with self._lock:
+            self._next_at = max(self._next_at, time.monotonic() + seconds)
+
+
+# Fixed pieces of the per-request instruction text
+INITIAL_PROMPT = "Hãy chấm bài tự luận toán của học sinh."
+SOLUTION_HEADER = "\n\n**LỜI GIẢI THAM KHẢO:**\n"
+CLARIFY_HEADER = "\n\n**CHẤM LẠI VỚI CLARIFICATION:**\n"
+
+
+def _build_initial_text(
+    clarify: Optional[str],
+    previous_grading: Optional[Dict[str, Any]],
+    solution: Optional[Dict[str, Any]],
+) -> str:
+    """Instruction text sent ahead of the images: task, reference solution, clarification."""
+    buf: List[str] = [INITIAL_PROMPT]
+    if solution and solution.get("steps"):
+        buf.append(SOLUTION_HEADER)
+        buf.extend(
+            f"Bước {i}: {step.get('description','')}\n{step.get('content','')}\n\n"
+            for i, step in enumerate(solution["steps"], 1)
+        )
+    if clarify and previous_grading:
+        buf.append(CLARIFY_HEADER)
+        buf.append(f"Thầy cô clarify: {clarify}\n")
+    return "".join(buf)
+
 
 class GeminiGrader:
     def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
@@ -20,11 +161,22 @@ class GeminiGrader:
             raise ValueError("GEMINI_API_KEY is required")
         self.client = genai.Client(api_key=self.api_key)
         self.logger = logging.getLogger("grading")
+        # get_grader() shares one instance per process, so these bound the whole process
+        self._slots = threading.BoundedSemaphore(max(1, getattr(settings, "GEMINI_MAX_CONCURRENT", 10)))
+        self._rate_limiter = _RateLimiter(getattr(settings, "GEMINI_RPM_LIMIT", 0))
+        self.max_retries = getattr(settings, "GEMINI_MAX_RETRIES", 3)
+        self.max_image_dim = getattr(settings, "GEMINI_MAX_IMAGE_DIM", 0)
+        # Same system prompt and options on every call; the SDK only reads it
+        self._generation_config = types.GenerateContentConfig(
+            system_instruction=GEMINI_VISION_GRADING_PROMPT,
+            temperature=0,
+            response_mime_type="application/json",
+        )
 
     @staticmethod
     def _mime(path: str) -> str:
         ext = Path(path).suffix.lower()
-        return {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}.get(ext, "image/jpeg")
+        return IMAGE_MIME_TYPES.get(ext, "image/jpeg")
 
     def grade_image_pair(
         self,
@@ -33,59 +185,86 @@ class GeminiGrader:
         clarify: Optional[str] = None,
         previous_grading: Optional[Dict[str, Any]] = None,
         solution: Optional[Dict[str, Any]] = None,
+        use_cache: bool = True,
     ) -> Dict[str, Any]:
         run_id = str(uuid.uuid4())
-        self.logger.debug(
-            "run=%s start grade_image_pair model=%s q_count=%d a_count=%d clarify=%s has_previous=%s has_solution=%s",
-            run_id,
-            self.model_name,
-            len(question_image_paths or []),
-            len(answer_image_paths or []),
-            bool(clarify),
-            bool(previous_grading),
-            bool(solution and solution.get("steps")),
-        )
-        # Build initial instruction
-        initial_text = "Hãy chấm bài tự luận toán của học sinh."
-        if solution and solution.get("steps"):
-            initial_text += "\n\n**LỜI GIẢI THAM KHẢO:**\n"
-            for i, step in enumerate(solution["steps"], 1):
-                initial_text += f"Bước {i}: {step.get('description','')}\n{step.get('content','')}\n\n"
-        if clarify and previous_grading:
-            initial_text += "\n\n**CHẤM LẠI VỚI CLARIFICATION:**\n"
-            initial_text += f"Thầy cô clarify: {clarify}\n"
+        # Debug lines build slices/lists for their arguments; skip that work when DEBUG is off
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "run=%s start grade_image_pair model=%s q_count=%d a_count=%d clarify=%s has_previous=%s has_solution=%s",
+                run_id,
+                self.model_name,
+                len(question_image_paths or []),
+                len(answer_image_paths or []),
+                bool(clarify),
+                bool(previous_grading),
+                bool(solution and solution.get("steps")),
+            )
+        initial_text = _build_initial_text(clarify, previous_grading, solution)
 
         parts: List[types.Part] = [types.Part.from_text(text=initial_text)]
+        # Fingerprint of the full request (model, prompts, image contents) for the result cache
+        request_hash = hashlib.sha256()
+        for chunk in (self.model_name, str(self.max_image_dim), GEMINI_VISION_GRADING_PROMPT, initial_text):
+            request_hash.update(chunk.encode("utf-8"))
+            request_hash.update(b"\0")
 
-        for p in question_image_paths:
-            if not os.path.exists(p):
-                raise FileNotFoundError(f"Question image not found: {p}")
-            with open(p, "rb") as f:
-                parts.append(types.Part.from_bytes(data=f.read(), mime_type=self._mime(p)))
-
-        for p in answer_image_paths:
-            if not os.path.exists(p):
-                raise FileNotFoundError(f"Answer image not found: {p}")
-            with open(p, "rb") as f:
-                parts.append(types.Part.from_bytes(data=f.read(), mime_type=self._mime(p)))
-
-        self.logger.debug(
-            "run=%s prompt_preview=%s q_paths=%s a_paths=%s",
-            run_id,
-            initial_text[:300],
-            [str(p) for p in question_image_paths],
-            [str(p) for p in answer_image_paths],
-        )
+        parts += self._build_parts(question_image_paths, "q", "Question", request_hash)
+        parts += self._build_parts(answer_image_paths, "a", "Answer", request_hash)
 
-        resp = self.client.models.generate_content(
-            model=self.model_name,
-            contents=[types.Content(role="user", parts=parts)],
-            config=types.GenerateContentConfig(
-                system_instruction=GEMINI_VISION_GRADING_PROMPT,
-                temperature=0,
-                response_mime_type="application/json",
-            ),
-        )
+        cache_key = None
+        if getattr(settings, "GRADING_CACHE_ENABLED", False):
+            cache_key = f"grade:{request_hash.hexdigest()}"
+            if use_cache:
+                cached = caches[GRADING_CACHE_ALIAS].get(cache_key)
+                if cached is not None:
+                    self.logger.debug("run=%s cache_hit key=%s", run_id, cache_key)
+                    return cached
+
+        if cache_key is None:
+            return self._grade_uncached(run_id, parts, initial_text, question_image_paths, answer_image_paths, None)
+
+        # Identical request already at the model on another thread (e.g. a regrade fired twice, or
+        # racing a queued job). Forced regrades join too: the leader's answer is just as fresh.
+        # Wait for it and reuse its stored verdict instead of paying for a second call
+        with _INFLIGHT_LOCK:
+            leader = _INFLIGHT.get(cache_key)
+            if leader is None:
+                _INFLIGHT[cache_key] = owned = threading.Event()
+        if leader is not None:
+            leader.wait(INFLIGHT_WAIT_SECONDS)
+            cached = caches[GRADING_CACHE_ALIAS].get(cache_key)
+            if cached is not None:
+                self.logger.debug("run=%s shared in-flight result key=%s", run_id, cache_key)
+                return cached
+            return self._grade_uncached(run_id, parts, initial_text, question_image_paths, answer_image_paths, cache_key)
+        try:
+            return self._grade_uncached(run_id, parts, initial_text, question_image_paths, answer_image_paths, cache_key)
+        finally:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(cache_key, None)
+            owned.set()
+
+    def _grade_uncached(
+        self,
+        run_id: str,
+        parts: List[types.Part],
+        initial_text: str,
+        question_image_paths: List[str],
+        answer_image_paths: List[str],
+        cache_key: Optional[str],
+    ) -> Dict[str, Any]:
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug(
+                "run=%s prompt_preview=%s q_paths=%s a_paths=%s",
+                run_id,
+                initial_text[:300],
+                [str(p) for p in question_image_paths],
+                [str(p) for p in answer_image_paths],
+            )
+
+        resp = self._generate(run_id, parts)
 
         # Extract token usage metadata
         usage_metadata = getattr(resp, "usage_metadata", None)
@@ -93,6 +272,8 @@ class GeminiGrader:
             prompt_tokens = getattr(usage_metadata, "prompt_token_count", 0)
             completion_tokens = getattr(usage_metadata, "candidates_token_count", 0)
             total_tokens = getattr(usage_metadata, "total_token_count", 0)
+            # Implicit context-cache hits on the shared system prompt prefix
+            cached_tokens = getattr(usage_metadata, "cached_content_token_count", 0) or 0
             
             # Gemini 2.5 Flash pricing (as of 2025): $0.075 per 1M input tokens, $0.30 per 1M output tokens
             input_cost = (prompt_tokens / 1_000_000) * 0.075
@@ -100,35 +281,87 @@ class GeminiGrader:
             total_cost = input_cost + output_cost
             
             self.logger.info(
-                "run=%s USAGE model=%s prompt_tokens=%d completion_tokens=%d total_tokens=%d input_cost=$%.6f output_cost=$%.6f total_cost=$%.6f",
-                run_id, self.model_name, prompt_tokens, completion_tokens, total_tokens,
+                "run=%s USAGE model=%s prompt_tokens=%d cached_tokens=%d completion_tokens=%d total_tokens=%d input_cost=$%.6f output_cost=$%.6f total_cost=$%.6f",
+                run_id, self.model_name, prompt_tokens, cached_tokens, completion_tokens, total_tokens,
                 input_cost, output_cost, total_cost
             )
         else:
             self.logger.warning("run=%s No usage_metadata in response", run_id)
 
-        self.logger.debug("run=%s llm_raw_text=%s", run_id, getattr(resp, "text", "")[:500])
+        if debug:
+            self.logger.debug("run=%s llm_raw_text=%s", run_id, (getattr(resp, "text", "") or "")[:500])
+
+        result, ok = self._parse_response(run_id, resp)
+        # Only keep well-formed verdicts; anything else should be retried on the next call
+        if ok and cache_key and isinstance(result, dict) and "is_correct" in result:
+            caches[GRADING_CACHE_ALIAS].set(cache_key, result)
+        return result
 
+    def _generate(self, run_id: str, parts: List[types.Part]):
+        """generate_content under the process-wide concurrency/rate limits, retrying 429/5xx with backoff."""
+        for attempt in range(self.max_retries + 1):
+            self._rate_limiter.acquire()
+            try:
+                with self._slots:
+                    return self.client.models.generate_content(
+                        model=self.model_name,
+                        contents=[types.Content(role="user", parts=parts)],
+                        config=self._generation_config,
+                    )
+            except genai_errors.APIError as e:
+                if e.code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    raise
+                delay = min(30.0, 2.0 ** attempt) + random.uniform(0, 1)
+                if e.code == 429:
+                    # Quota is shared by every thread: pause them all, for as long as the API asked
+                    delay = _retry_delay_hint(e) or delay
+                    self._rate_limiter.defer(delay)
+                self.logger.warning("run=%s gemini status=%s, retry %d in %.1fs", run_id, e.code, attempt + 1, delay)
+                time.sleep(delay)
+
+    def _build_parts(self, paths: List[str], tag: str, label: str, request_hash) -> List[types.Part]:
+        """Image parts for one side of the pair; each image's digest is folded into request_hash."""
+        parts: List[types.Part] = []
+        for p in paths:
+            # image_digest stats the file anyway; a separate exists() check would be a second syscall
+            try:
+                digest = image_digest(p)
+            except FileNotFoundError as e:
+                raise FileNotFoundError(f"{label} image not found: {p}") from e
+            request_hash.update(f"{tag}:{digest}".encode("ascii"))
+            parts.append(_image_part(p, digest, self._mime(p), self.max_image_dim))
+        return parts
+
+    def _parse_response(self, run_id: str, resp) -> Tuple[Dict[str, Any], bool]:
+        """(result, ok): the model's JSON verdict, or an error verdict with ok=False."""
         if not resp or not getattr(resp, "text", ""):
             return {
                 "is_correct": False,
                 "critical_errors": [{"description": "Empty LLM response", "phrases": ["empty"]}],
                 "part_errors": [],
                 "partial_credit": False,
-            }
+            }, False
 
         try:
             parsed = json.loads(resp.text)
             self.logger.debug("run=%s parsed_result=%s", run_id, parsed)
-            return parsed
+            return parsed, True
         except json.JSONDecodeError:
+            salvaged = _salvage_json(resp.text)
+            if isinstance(salvaged, dict):
+                # The call was paid for; keep the verdict and leave a trace for prompt tuning
+                self.logger.warning("run=%s recovered JSON from fenced/padded LLM response", run_id)
+                return salvaged, True
             self.logger.exception("run=%s parse_error on LLM response", run_id)
             return {
                 "is_correct": False,
                 "critical_errors": [{"description": "Invalid JSON from LLM", "phrases": ["parse error"]}],
                 "part_errors": [],
                 "partial_credit": False,
-            }
-
+            }, False
 
 
+@lru_cache(maxsize=1)
+def get_grader() -> GeminiGrader:
+    """Process-wide grader built from settings, so its client (and HTTP connection pool) is reused."""
+    return GeminiGrader()
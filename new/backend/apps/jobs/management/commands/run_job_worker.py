@@ -1,26 +1,71 @@
-import json
+import logging
 import time
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.db import DatabaseError, connection, connections, transaction
 
 from apps.jobs.models import Job
 from apps.jobs.realesrgan import upscale_image
 from django.conf import settings
 from pathlib import Path
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from apps.jobs.services import notify
 from apps.submissions.models import SubmissionItem
 from apps.submissions.grading import grade_item_and_persist
 
+logger = logging.getLogger(__name__)
 
-@contextmanager
-def locked_job(job_id: int):
+
+def claim_next_job() -> Optional[Job]:
+    """Atomically move the oldest pending job to RUNNING and return it (None if there is nothing to claim).
+
+    The conditional UPDATE makes the claim safe between worker threads/processes even on
+    backends where select_for_update is a no-op (SQLite).
+    """
     with transaction.atomic():
-        job = Job.objects.select_for_update(skip_locked=True).get(id=job_id)
-        yield job
+        job = (
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Job.Status.PENDING)
+            .order_by("created_at")
+            .first()
+        )
+        if not job:
+            return None
+        started_at = datetime.utcnow()
+        claimed = Job.objects.filter(id=job.id, status=Job.Status.PENDING).update(
+            status=Job.Status.RUNNING, started_at=started_at
+        )
+        if not claimed:
+            return None
+        job.status = Job.Status.RUNNING
+        job.started_at = started_at
+        return job
+
+
+def run_job(job: Job) -> None:
+    try:
+        handler = HANDLERS.get(job.type)
+        if not handler:
+            raise ValueError(f"Unknown job type: {job.type}")
+        result = handler(job)
+
+        job.refresh_from_db()
+        job.status = Job.Status.SUCCEEDED
+        job.result = result
+        job.finished_at = datetime.utcnow()
+        job.save(update_fields=["status", "result", "finished_at"])
+        # Emit websocket notification
+        notify({"event": job.type, "job_id": job.id, "status": job.status, "result": job.result})
+    except Exception as e:
+        job.refresh_from_db()
+        job.status = Job.Status.FAILED
+        job.error = str(e)
+        job.retries += 1
+        job.finished_at = datetime.utcnow()
+        job.save(update_fields=["status", "error", "retries", "finished_at"])
 
 
 def handle_upscale(job: Job):
@@ -36,7 +81,9 @@ def handle_upscale(job: Job):
 
 HANDLERS = {
     "UPSCALE_SUBMISSION": handle_upscale,
-    "GRADE_ITEM": lambda job: (grade_item_and_persist(SubmissionItem.objects.get(id=job.payload.get("submission_item_id"))) or {"graded": True}),
+    "GRADE_ITEM": lambda job: (grade_item_and_persist(
+        SubmissionItem.objects.select_related("question", "grading").get(id=job.payload.get("submission_item_id"))
+    ) or {"graded": True}),
 }
 
 
@@ -44,61 +91,48 @@ class Command(BaseCommand):
     help = "Run simple DB-backed job worker"
 
     def add_arguments(self, parser):
-        parser.add_argument("--once", action="store_true")
+        parser.add_argument("--once", action="store_true", help="Run at most one job, then exit")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "JOB_WORKER_CONCURRENCY", 1),
+            help="Jobs to run in parallel (threads); jobs are I/O-bound LLM calls. Ignored with --once",
+        )
 
     def handle(self, *args, **options):
         run_once = options.get("once", False)
-        while True:
-            job = (
-                Job.objects
-                .filter(status=Job.Status.PENDING)
-                .order_by("created_at")
-                .first()
-            )
-            if not job:
-                if run_once:
-                    return
-                time.sleep(1)
-                continue
-
-            try:
-                with locked_job(job.id):
-                    job.refresh_from_db()
-                    if job.status != Job.Status.PENDING:
-                        continue
-                    job.status = Job.Status.RUNNING
-                    job.started_at = datetime.utcnow()
-                    job.save(update_fields=["status", "started_at"])
-
-                handler = HANDLERS.get(job.type)
-                if not handler:
-                    raise ValueError(f"Unknown job type: {job.type}")
-                result = handler(job)
-
-                job.refresh_from_db()
-                job.status = Job.Status.SUCCEEDED
-                job.result = result
-                job.finished_at = datetime.utcnow()
-                job.save(update_fields=["status", "result", "finished_at"])
-                # Emit websocket notification
+        # --once means a single job, however many threads the worker would normally run
+        concurrency = 1 if run_once else max(1, options.get("concurrency") or 1)
+        if concurrency == 1:
+            self.work(run_once)
+            return
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(self.work, run_once) for _ in range(concurrency)]:
+                future.result()
+
+    def work(self, run_once: bool):
+        try:
+            while True:
                 try:
-                    channel_layer = get_channel_layer()
-                    async_to_sync(channel_layer.group_send)(
-                        "notifications",
-                        {"type": "notify", "payload": {"event": job.type, "job_id": job.id, "status": job.status, "result": job.result}},
-                    )
-                except Exception:
-                    pass
-            except Exception as e:
-                job.refresh_from_db()
-                job.status = Job.Status.FAILED
-                job.error = str(e)
-                job.retries += 1
-                job.finished_at = datetime.utcnow()
-                job.save(update_fields=["status", "error", "retries", "finished_at"])
-            finally:
+                    job = claim_next_job()
+                except DatabaseError:
+                    if run_once:
+                        raise
+                    # A DB blip while polling must not silently end this thread (the others
+                    # keep the process alive): log it, drop the connection and poll again
+                    logger.exception("Claiming the next job failed; retrying")
+                    connection.close()
+                    time.sleep(1)
+                    continue
+                if not job:
+                    if run_once:
+                        return
+                    time.sleep(1)
+                    continue
+                run_job(job)
                 if run_once:
                     return
                 time.sleep(0.1)
-
-
+        finally:
+            # Each worker thread has its own DB connection
+            connections.close_all()
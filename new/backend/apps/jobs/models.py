@@ -24,6 +24,13 @@ class Job(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Worker poll (oldest pending first) and active-job lookups touch only
+            # pending/running rows instead of scanning the whole job history
+            models.Index(fields=["status", "created_at"], name="jobs_job_status_created_idx"),
+        ]
+
     def __str__(self) -> str:
         return f"Job[{self.id}] {self.type} - {self.status}"
 
@@ -1,4 +1,6 @@
 from typing import Optional, List, Dict, Any
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from apps.jobs.models import Job
 
 
@@ -7,6 +9,15 @@ def enqueue(job_type: str, payload: Optional[dict] = None, max_retries: int = 3)
 	return job.id
 
 
+def notify(payload: Dict[str, Any]) -> None:
+	"""Broadcast to the websocket "notifications" group; best effort, never raises."""
+	try:
+		channel_layer = get_channel_layer()
+		async_to_sync(channel_layer.group_send)("notifications", {"type": "notify", "payload": payload})
+	except Exception:
+		pass
+
+
 def enqueue_upscale_submission(submission_id: int, image_paths: List[str]) -> int:
 	return enqueue("UPSCALE_SUBMISSION", {"submission_id": submission_id, "image_paths": image_paths})
 
@@ -27,3 +38,26 @@ def enqueue_grade_item_if_not_exists(submission_item_id: int) -> Optional[int]:
         return existing.id
     return enqueue("GRADE_ITEM", {"submission_item_id": submission_item_id})
 
+
+def enqueue_grade_items_if_not_exist(submission_item_ids: List[int]) -> List[int]:
+	"""Bulk enqueue_grade_item_if_not_exists: one query for active jobs, one INSERT for the rest.
+	Returns job ids (existing or new) in the order of submission_item_ids.
+	"""
+	item_ids = list(dict.fromkeys(submission_item_ids))
+	active = Job.objects.filter(
+		type="GRADE_ITEM",
+		status__in=[Job.Status.PENDING, Job.Status.RUNNING],
+		payload__submission_item_id__in=item_ids,
+	).order_by("id").values_list("id", "payload")
+	job_by_item: Dict[int, int] = {}
+	for job_id, payload in active:
+		job_by_item.setdefault((payload or {}).get("submission_item_id"), job_id)
+
+	new_jobs = [
+		Job(type="GRADE_ITEM", payload={"submission_item_id": item_id}, max_retries=3)
+		for item_id in item_ids
+		if item_id not in job_by_item
+	]
+	for job in Job.objects.bulk_create(new_jobs):
+		job_by_item[job.payload["submission_item_id"]] = job.id
+	return [job_by_item[item_id] for item_id in item_ids if item_id in job_by_item]
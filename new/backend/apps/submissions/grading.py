@@ -1,14 +1,16 @@
 from __future__ import annotations
 
+import logging
 from typing import Dict, Any, Optional
 from .models import SubmissionItem, Grading
 from apps.common.files import normalized_path_exists
-from apps.grading.gemini import GeminiGrader
+from apps.grading.gemini import get_grader
 
+logger = logging.getLogger(__name__)
 
 def simple_grade_logic(item: SubmissionItem, clarify: Optional[str] = None) -> Dict[str, Any]:
     try:
-        grader = GeminiGrader()
+        grader = get_grader()
         q_paths = item.question.question_image_paths or []
         a_paths = item.answer_image_paths or []
 
@@ -18,23 +20,21 @@ def simple_grade_logic(item: SubmissionItem, clarify: Optional[str] = None) -> D
         if not a_paths:
             raise ValueError("No answer images found")
 
-        # Check if image files exist
-        for path in q_paths + a_paths:
+        # Check if image files exist (once per distinct path)
+        for path in dict.fromkeys(q_paths + a_paths):
             if not normalized_path_exists(path):
                 raise FileNotFoundError(f"Image file not found: {path}")
 
         previous = None
-        try:
-            if item.grading:
-                previous = {
-                    "is_correct": item.grading.is_correct,
-                    "error_description": item.grading.error_description,
-                    "error_phrases": item.grading.error_phrases,
-                    "partial_credit": item.grading.partial_credit,
-                }
-        except:
-            # No grading exists yet, which is fine
-            previous = None
+        # Reverse one-to-one raises (an AttributeError subclass) when no grading exists yet
+        grading = getattr(item, "grading", None)
+        if grading is not None:
+            previous = {
+                "is_correct": grading.is_correct,
+                "error_description": grading.error_description,
+                "error_phrases": grading.error_phrases,
+                "partial_credit": grading.partial_credit,
+            }
 
         solution = None
         if item.question.solution_steps:
@@ -44,7 +44,11 @@ def simple_grade_logic(item: SubmissionItem, clarify: Optional[str] = None) -> D
             except Exception:
                 solution = None
 
-        result = grader.grade_image_pair(q_paths, a_paths, clarify=clarify, previous_grading=previous, solution=solution)
+        # An item that already has a grading is being regraded on purpose: ask the model again
+        result = grader.grade_image_pair(
+            q_paths, a_paths, clarify=clarify, previous_grading=previous, solution=solution,
+            use_cache=previous is None,
+        )
         
         # Validate the result structure
         if not isinstance(result, dict):
@@ -74,9 +78,7 @@ def simple_grade_logic(item: SubmissionItem, clarify: Optional[str] = None) -> D
         }
     except Exception as e:
         # API or other unexpected errors
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Grading failed for item {item.id}: {str(e)}", exc_info=True)
+        logger.error("Grading failed for item %s: %s", item.id, e, exc_info=True)
         
         return {
             "is_correct": False,
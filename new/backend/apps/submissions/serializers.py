@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from apps.exams.models import Exam
 from .models import Submission
 
 
@@ -1,4 +1,5 @@
-from typing import List
+from functools import lru_cache
+from typing import Dict, List, Set, Tuple
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
@@ -9,71 +10,125 @@ import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from apps.common.files import (
-    validate_image_file,
-    validate_pdf_file,
-    save_uploaded_image,
-    save_uploaded_pdf,
+    validate_uploaded_files,
+    save_uploaded_files,
     delete_image_file,
     delete_image_files,
+    media_url,
+    build_missing_thumbnails,
+    thumbnail_urls,
 )
 from pathlib import Path
-from apps.exams.models import Exam, Question
+from apps.exams.models import Question
 from apps.common.image_ops import crop_bbox
-from apps.common.files import normalized_path_exists
+from apps.common.files import existing_path_set, normalized_path_exists
 from .models import Submission, SubmissionItem
 from .serializers import SubmissionSerializer
 from apps.jobs.services import enqueue_upscale_submission
-from apps.jobs.services import enqueue, enqueue_grade_item_if_not_exists
+from apps.jobs.services import enqueue, enqueue_grade_item_if_not_exists, enqueue_grade_items_if_not_exist, notify
 from .grading import grade_item_and_persist
+from PIL import Image as PILImage
 from reportlab.pdfgen import canvas as pdf_canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+import logging
 import os
 import uuid
 
-# Register Unicode font for Vietnamese text support
-UNICODE_FONT = 'Helvetica'  # Default fallback
-try:
-    # Try common font paths for different systems
-    font_paths = [
-        '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',  # macOS
-        '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Linux
-        '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',  # Linux alternative
-        'C:\\Windows\\Fonts\\arial.ttf',  # Windows
-    ]
-    
-    for font_path in font_paths:
-        if os.path.exists(font_path):
-            pdfmetrics.registerFont(TTFont('UnicodeFont', font_path))
-            UNICODE_FONT = 'UnicodeFont'
-            print(f"Registered Unicode font: {font_path}")
-            break
-except Exception as e:
-    print(f"Could not register Unicode font, using Helvetica: {e}")
+logger = logging.getLogger(__name__)
+
+# Fonts tried, in order, for Vietnamese text in exported PDFs
+UNICODE_FONT_PATHS = [
+    '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',  # macOS
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Linux
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',  # Linux alternative
+    'C:\\Windows\\Fonts\\arial.ttf',  # Windows
+]
+
+
+@lru_cache(maxsize=1)
+def unicode_font_name() -> str:
+    """Register a Unicode TTF with reportlab on first PDF export; 'Helvetica' if none loads.
+
+    Parsing the TTF is the expensive part, so it is deferred from import time (every
+    web and job-worker process) to the first export that actually draws text.
+    """
+    try:
+        for font_path in UNICODE_FONT_PATHS:
+            if os.path.exists(font_path):
+                pdfmetrics.registerFont(TTFont('UnicodeFont', font_path))
+                logger.info("Registered Unicode font: %s", font_path)
+                return 'UnicodeFont'
+    except Exception as e:
+        logger.warning("Could not register Unicode font, using Helvetica: %s", e)
+    return 'Helvetica'
 
 # Unicode symbols for correct/incorrect markers
 CORRECT_ICON = "✓"  # or use "✅"
 INCORRECT_ICON = "✗"  # or use "❌"
 
+# PDF-safe glyphs for emoji icons, and English verdict labels -> Vietnamese
+ANNOTATION_TEXT_REPLACEMENTS = (
+    ('✅', '✓'), ('❌', '✗'),
+    # Warning emoji renders as tofu/rectangles in PDF
+    ('⚠️', '!'), ('⚠', '!'),
+    ('Incorrect', 'sai'), ('Correct', 'đúng'),
+)
+
+
+def normalize_annotation_text(text) -> str:
+    """Apply ANNOTATION_TEXT_REPLACEMENTS to an annotation's text."""
+    normalized = str(text or "")
+    for old, new in ANNOTATION_TEXT_REPLACEMENTS:
+        normalized = normalized.replace(old, new)
+    return normalized
+
+
+@lru_cache(maxsize=64)
+def _hex_to_rgb(color: str) -> Tuple[float, float, float]:
+    return int(color[1:3], 16) / 255, int(color[3:5], 16) / 255, int(color[5:7], 16) / 255
+
+
+def annotation_rgb(color) -> Tuple[float, float, float]:
+    """'#rrggbb' annotation color as reportlab 0..1 RGB; non-hex values fall back to red.
+
+    Annotations reuse a handful of colors, so parsed values are cached.
+    """
+    if isinstance(color, str) and color.startswith('#'):
+        return _hex_to_rgb(color)
+    return 1, 0, 0
+
+
+# ^digits -> superscript digits, for str.translate
+SUPERSCRIPT_DIGITS = str.maketrans('0123456789', '⁰¹²³⁴⁵⁶⁷⁸⁹')
+
+
+# \\u0394 (escaped twice, e.g. JSON inside JSON) and \u0394 literal escape sequences
+_DOUBLE_ESCAPED_UNICODE_RE = re.compile(r'\\\\u([0-9a-fA-F]{4})')
+_ESCAPED_UNICODE_RE = re.compile(r'\\u([0-9a-fA-F]{4})')
+
+
+def _replace_unicode(match):
+    try:
+        return chr(int(match.group(1), 16))
+    except ValueError:
+        return match.group(0)
+
 
 def decode_unicode_escapes(text):
     """Decode Unicode escape sequences in text"""
     if not isinstance(text, str):
         return text
-    
-    # Handle Unicode escape sequences like \u0394 (both literal and escaped)
-    def replace_unicode(match):
-        try:
-            return chr(int(match.group(1), 16))
-        except ValueError:
-            return match.group(0)
+    # Fast path: nearly all grader/annotation text has no escapes at all
+    if '\\u' not in text:
+        return text
     
     # First try to decode literal escape sequences like \\u0394
-    text = re.sub(r'\\\\u([0-9a-fA-F]{4})', replace_unicode, text)
+    text = _DOUBLE_ESCAPED_UNICODE_RE.sub(_replace_unicode, text)
     # Then try to decode actual escape sequences like \u0394
-    text = re.sub(r'\\u([0-9a-fA-F]{4})', replace_unicode, text)
+    text = _ESCAPED_UNICODE_RE.sub(_replace_unicode, text)
     
     return text
 
@@ -96,10 +151,7 @@ def normalize_math_text(raw_text: str) -> str:
         # minus
         text = text.replace('-', '−')
         # superscript digits after caret
-        sup_map = {'0':'⁰','1':'¹','2':'²','3':'³','4':'⁴','5':'⁵','6':'⁶','7':'⁷','8':'⁸','9':'⁹'}
-        def sup_repl(m):
-            return ''.join(sup_map.get(ch, ch) for ch in m.group(1))
-        text = re.sub(r"\^(\d+)", sup_repl, text)
+        text = re.sub(r"\^(\d+)", lambda m: m.group(1).translate(SUPERSCRIPT_DIGITS), text)
         return text
     except Exception:
         return str(raw_text or '')
@@ -120,6 +172,20 @@ def sanitize_saved_lines(saved_lines):
         return [str(ln) for ln in (saved_lines or [])]
 
 
+def _prune_missing_answer_images(item: SubmissionItem, existing: Set[str]) -> List[str]:
+    """Drop answer crops that are no longer on disk (per ``existing_path_set``) and persist the cleanup."""
+    raw_paths = item.answer_image_paths or []
+    paths = [p for p in raw_paths if str(p) in existing]
+    if paths != raw_paths:
+        try:
+            item.answer_image_paths = paths
+            item.has_multiple_images = len(paths) > 1
+            item.save(update_fields=["answer_image_paths", "has_multiple_images"])
+        except Exception:
+            pass
+    return paths
+
+
 class SubmissionViewSet(viewsets.ModelViewSet):
     queryset = Submission.objects.all().order_by("-id")
     serializer_class = SubmissionSerializer
@@ -131,23 +197,12 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         if not files:
             return Response({"detail": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        saved_paths: List[str] = []
-        target_dir = settings.MEDIA_SUBMISSIONS_DIR / f"submission_{submission.id}"
+        ok, msg = validate_uploaded_files(files)
+        if not ok:
+            return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
 
-        for f in files:
-            name = f.name.lower()
-            if name.endswith(".pdf"):
-                ok, msg = validate_pdf_file(f)
-                if not ok:
-                    return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
-                images = save_uploaded_pdf(f, target_dir, prefix=f"sub{submission.id}")
-                saved_paths.extend([str(p) for p in images])
-            else:
-                ok, msg = validate_image_file(f)
-                if not ok:
-                    return Response({"detail": msg}, status=status.HTTP_400_BAD_REQUEST)
-                img_path = save_uploaded_image(f, target_dir, prefix=f"sub{submission.id}")
-                saved_paths.append(str(img_path))
+        target_dir = settings.MEDIA_SUBMISSIONS_DIR / f"submission_{submission.id}"
+        saved_paths = save_uploaded_files(files, target_dir, prefix=f"sub{submission.id}")
 
         existing = submission.original_image_paths or []
         submission.original_image_paths = existing + saved_paths
@@ -165,24 +220,7 @@ class SubmissionViewSet(viewsets.ModelViewSet):
     def images(self, request, pk=None):
         submission = get_object_or_404(Submission, pk=pk)
         paths = submission.original_image_paths or []
-        media_root = str(settings.MEDIA_ROOT)
-        media_url = settings.MEDIA_URL.rstrip("/")
-        urls = []
-        for p in paths:
-            try:
-                sp = str(p)
-                # Handle Unicode normalization issues by normalizing both paths
-                import unicodedata
-                normalized_path = unicodedata.normalize('NFC', sp)
-                normalized_media_root = unicodedata.normalize('NFC', media_root)
-                
-                if normalized_path.startswith(normalized_media_root):
-                    rel = normalized_path[len(normalized_media_root):].lstrip("/")
-                    urls.append(request.build_absolute_uri(f"{media_url}/{rel}"))
-                else:
-                    urls.append(sp)
-            except Exception:
-                urls.append(sp)
+        urls = [media_url(request, p) for p in paths]
         return Response({"count": len(urls), "urls": urls})
 
     @action(detail=True, methods=["post"], url_path="items")
@@ -232,7 +270,6 @@ class SubmissionViewSet(viewsets.ModelViewSet):
             return Response({"detail": f"Failed to save answer image: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # original page dimensions for scaling annotations
-        from PIL import Image as PILImage
         with PILImage.open(src_path) as original_img:
             orig_w, orig_h = int(original_img.width), int(original_img.height)
 
@@ -248,8 +285,7 @@ class SubmissionViewSet(viewsets.ModelViewSet):
 
         # Optionally enqueue grading job based on feature flag
         try:
-            from django.conf import settings as dj_settings
-            if getattr(dj_settings, "AUTO_GRADE_ON_CREATE", False):
+            if getattr(settings, "AUTO_GRADE_ON_CREATE", False):
                 enqueue("GRADE_ITEM", {"submission_item_id": item.id})
         except Exception:
             pass
@@ -265,25 +301,17 @@ class SubmissionViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"], url_path="grade")
     def grade_submission(self, request, pk=None):
         """
-        Grade all items in a submission concurrently using ThreadPoolExecutor.
-        With concurrent grading, 10 items take ~15-20s instead of ~150s sequential.
+        Queue a GRADE_ITEM job for every item in a submission; the job worker grades them concurrently.
+        Items that already have a pending/running job keep it instead of getting a duplicate.
         """
         submission = get_object_or_404(Submission, pk=pk)
-        items = list(submission.items.all())
+        items = list(submission.items.values_list("id", flat=True))
         
         if not items:
             return Response({"graded_count": 0, "message": "No items to grade"})
         
-        # Concurrency limit: max workers for parallel grading
-        # For 3-4 users, this means max 30-40 concurrent calls total
-        max_concurrent = getattr(settings, 'MAX_CONCURRENT_GRADING', 10)
-        
-        # Non-blocking mode: enqueue each item if not already being graded
-        job_ids = []
-        for it in items:
-            job_id = enqueue_grade_item_if_not_exists(it.id)
-            if job_id:
-                job_ids.append(job_id)
+        # Non-blocking mode: one lookup + one bulk insert, not a query pair per item
+        job_ids = enqueue_grade_items_if_not_exist(items)
         return Response({
             "status": "queued",
             "queued_jobs": job_ids,
@@ -301,7 +329,7 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         if not clarify:
             return Response({"detail": "clarify is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        items = list(submission.items.all())
+        items = list(submission.items.select_related("question", "grading").all())
         
         if not items:
             return Response({"graded_count": 0, "clarify": clarify})
@@ -309,7 +337,6 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         # Same concurrency limit
         max_concurrent = getattr(settings, 'MAX_CONCURRENT_GRADING', 10)
         
-        results = []
         successful = 0
         failed = 0
         
@@ -320,15 +347,20 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                 for item in items
             }
             
+            # Announce each item as it lands rather than holding results until the batch ends
             for future in as_completed(future_to_item):
+                item = future_to_item[future]
                 try:
-                    result = future.result()
-                    results.append(result)
-                    successful += 1
+                    grading_id = future.result()
                 except Exception as e:
-                    item = future_to_item[future]
-                    print(f"Failed to regrade item {item.id}: {e}")
+                    logger.error("Failed to regrade item %s: %s", item.id, e)
                     failed += 1
+                    notify({"event": "GRADE_ITEM", "submission_id": submission.id, "item_id": item.id, "status": "failed", "error": str(e)})
+                    continue
+                successful += 1
+                notify({"event": "GRADE_ITEM", "submission_id": submission.id, "item_id": item.id, "status": "succeeded", "result": {"grading_id": grading_id}})
+        
+        notify({"event": "REGRADE_SUBMISSION", "submission_id": submission.id, "status": "succeeded", "result": {"graded_count": successful, "failed_count": failed}})
         
         response_data = {
             "graded_count": successful,
@@ -363,7 +395,7 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                 "item_id": it.id,
                 "question": {
                     "id": it.question.id,
-                    "label": f"{it.question.order_index}{it.question.part_label or ''}",
+                    "label": it.question.label,
                 },
                 "graded": bool(g),
                 "is_correct": getattr(g, "is_correct", None),
@@ -382,44 +414,27 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         """List all submission items with image status"""
         submission = get_object_or_404(Submission, pk=pk)
         items = submission.items.select_related("question").all()
-        media_root = str(settings.MEDIA_ROOT)
-        media_url = settings.MEDIA_URL.rstrip("/")
-        
+
+        # One directory listing per folder for all items, instead of a stat per path
+        existing = existing_path_set(p for item in items for p in (item.answer_image_paths or []))
+
+        paths_by_item = {item.id: _prune_missing_answer_images(item, existing) for item in items}
+        # Build every item's missing thumbnails in one pool; the per-item calls below then find none
+        build_missing_thumbnails(p for paths in paths_by_item.values() for p in paths)
+
         result = []
         for item in items:
-            # Remove any missing paths and persist cleanup
-            raw_paths = item.answer_image_paths or []
-            paths = [p for p in raw_paths if normalized_path_exists(p)]
-            urls = []
-            for p in paths:
-                try:
-                    sp = str(p)
-                    import unicodedata
-                    normalized_path = unicodedata.normalize('NFC', sp)
-                    normalized_media_root = unicodedata.normalize('NFC', media_root)
-                    
-                    if normalized_path.startswith(normalized_media_root):
-                        rel = normalized_path[len(normalized_media_root):].lstrip("/")
-                        urls.append(request.build_absolute_uri(f"{media_url}/{rel}"))
-                    else:
-                        urls.append(sp)
-                except Exception:
-                    urls.append(p)
-            if paths != raw_paths:
-                try:
-                    item.answer_image_paths = paths
-                    item.has_multiple_images = len(paths) > 1
-                    item.save(update_fields=["answer_image_paths", "has_multiple_images"])
-                except Exception:
-                    pass
-            
+            paths = paths_by_item[item.id]
+            urls = [media_url(request, p) for p in paths]
+
             result.append({
                 "item_id": item.id,
                 "question_id": item.question.id,
-                "question_label": f"{item.question.order_index}{item.question.part_label or ''}",
+                "question_label": item.question.label,
                 "has_images": len(paths) > 0,
                 "image_count": len(paths),
                 "image_urls": urls,
+                "thumbnail_urls": thumbnail_urls(request, paths),
                 "has_multiple_images": item.has_multiple_images,
             })
         
@@ -455,23 +470,27 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                 sw = pdfmetrics.stringWidth
             except Exception:
                 # Fallback: no wrapping if metrics unavailable
-                return str(text or '').split('\n')
+                return str(text or '').splitlines() or ['']
 
-            paragraphs = str(text or '').split('\n')
+            # Glyph widths add up, so measure each word once instead of re-measuring the growing line
+            space_w = sw(' ', font_name, font_size)
             wrapped_lines = []
-            for para in paragraphs:
+            for para in str(text or '').splitlines() or ['']:
                 words = para.split()
                 if not words:
                     wrapped_lines.append('')
                     continue
                 line = words[0]
+                line_w = sw(line, font_name, font_size)
                 for word in words[1:]:
-                    trial = f"{line} {word}"
-                    if sw(trial, font_name, font_size) <= max_width:
-                        line = trial
+                    word_w = sw(word, font_name, font_size)
+                    if line_w + space_w + word_w <= max_width:
+                        line = f"{line} {word}"
+                        line_w += space_w + word_w
                     else:
                         wrapped_lines.append(line)
                         line = word
+                        line_w = word_w
                 wrapped_lines.append(line)
             return wrapped_lines
 
@@ -484,9 +503,19 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         export_dir.mkdir(parents=True, exist_ok=True)
         out_path = export_dir / f"submission_{submission.id}.pdf"
 
+        unicode_font = unicode_font_name()
+
         # Create a PDF concatenating images to A4 pages and overlaying annotations
         c = pdf_canvas.Canvas(str(out_path), pagesize=A4)
         page_w, page_h = A4
+
+        # Load items once; each page then only walks the items cropped from it
+        items = list(submission.items.select_related('grading', 'question').all())
+        items_by_page: Dict[int, List[SubmissionItem]] = {}
+        for it in items:
+            for src_page in dict.fromkeys(it.source_page_indices or []):
+                items_by_page.setdefault(src_page, []).append(it)
+
         for page_idx, img_path in enumerate(images):
             try:
                 img = ImageReader(str(img_path))
@@ -499,19 +528,16 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                 c.drawImage(img, x, y, width=dw, height=dh, preserveAspectRatio=True, anchor='c')
 
                 # Overlay annotations for items mapped to this page
-                items = submission.items.select_related('grading', 'question').all()
-                print(f"\nPage {page_idx}: Found {items.count()} items")
+                page_items = items_by_page.get(page_idx, [])
+                logger.debug("export page=%d items=%d", page_idx, len(page_items))
                 
                 # Removed page-level status header per requirement; status should come from annotations only
                 
                 # Now process annotations for each item
-                for it in items:
+                for it in page_items:
                     src_pages = (it.source_page_indices or [])
-                    print(f"  Item {it.id}: source_pages={src_pages}, annotations={len(it.annotations or [])}")
-                    if page_idx not in src_pages:
-                        continue
+                    logger.debug("export item=%s source_pages=%s annotations=%d", it.id, src_pages, len(it.annotations or []))
                     ann = it.annotations or []
-                    print(f"  -> Processing {len(ann)} annotations for item {it.id}")
                     # Determine this image's index within the item's images
                     try:
                         image_slot_index = src_pages.index(page_idx)
@@ -525,11 +551,10 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                     for obj in ann:
                         try:
                             otype = obj.get('type')
-                            print(f"    Processing annotation: type={otype}, keys={list(obj.keys())}")
+                            logger.debug("export annotation type=%s keys=%s", otype, obj.keys())
 
                             # Skip ALL rectangle boxes - we'll render clean text instead
                             if otype == 'rect':
-                                print(f"      -> Skipping rect annotation completely")
                                 continue
 
                             # Normalized annotations (0..1 relative to CROPPED answer image)
@@ -541,11 +566,11 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                                     obj_page_val = obj.get('page')
                                     if obj_page_val is None:
                                         if image_slot_index != 0:
-                                            print("      -> Skipping (no page, not first image)")
+                                            logger.debug("export skip annotation: no page, not first image")
                                             continue
                                     else:
                                         if int(obj_page_val) != int(image_slot_index):
-                                            print(f"      -> Skipping (page {obj_page_val} != slot {image_slot_index})")
+                                            logger.debug("export skip annotation: page %s != slot %s", obj_page_val, image_slot_index)
                                             continue
                                 except Exception:
                                     # On any error, default to draw only first image
@@ -570,7 +595,10 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                                     ny = bbox_y + ny * bbox_h
                                     nw = nw * bbox_w
                                     nh = nh * bbox_h
-                                    print(f"      Transformed: bbox=({bbox_x:.3f},{bbox_y:.3f},{bbox_w:.3f},{bbox_h:.3f}) -> ann=({nx:.3f},{ny:.3f},{nw:.3f},{nh:.3f})")
+                                    logger.debug(
+                                        "export transformed bbox=(%.3f,%.3f,%.3f,%.3f) -> ann=(%.3f,%.3f,%.3f,%.3f)",
+                                        bbox_x, bbox_y, bbox_w, bbox_h, nx, ny, nw, nh,
+                                    )
                                 
                                 # Now nx, ny, nw, nh are normalized to FULL image
                                 # Scale normalized -> drawn image space
@@ -584,16 +612,10 @@ class SubmissionViewSet(viewsets.ModelViewSet):
 
                                 if otype == 'rect':
                                     stroke = obj.get('stroke', '#ff0000')
-                                    if isinstance(stroke, str) and stroke.startswith('#'):
-                                        r = int(stroke[1:3], 16) / 255
-                                        g = int(stroke[3:5], 16) / 255
-                                        b = int(stroke[5:7], 16) / 255
-                                        c.setStrokeColorRGB(r, g, b)
-                                    else:
-                                        c.setStrokeColorRGB(1, 0, 0)
+                                    c.setStrokeColorRGB(*annotation_rgb(stroke))
                                     c.setLineWidth(int(obj.get('strokeWidth', 2)))
                                     c.rect(left, base_y, width_scaled, height_scaled, stroke=1, fill=0)
-                                    print(f"      -> Drew rect at ({left}, {base_y}) size ({width_scaled}, {height_scaled})")
+                                    logger.debug("export drew rect at (%s, %s) size (%s, %s)", left, base_y, width_scaled, height_scaled)
                                     
                                 elif otype in ('textbox', 'text'):
                                     # If per-annotation page is present, render only on matching page
@@ -609,42 +631,28 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                                     except Exception as _:
                                         pass
                                     text = obj.get('text', '')
-                                    text = normalize_math_text(decode_unicode_escapes(text))
-                                    try:
-                                        # Normalize icons to PDF-safe symbols
-                                        text = text.replace('✅', '✓').replace('❌', '✗')
-                                        text = text.replace('⚠️', '!').replace('⚠', '!')
-                                        # Normalize common labels
-                                        text = text.replace('Incorrect', 'sai').replace('Correct', 'đúng')
-                                    except Exception:
-                                        pass
+                                    text = normalize_annotation_text(normalize_math_text(decode_unicode_escapes(text)))
                                     font_size = int(obj.get('fontSize', 16))
                                     line_height = float(obj.get('lineHeight', 1.2))
                                     text_align = (obj.get('textAlign') or 'left').lower()
                                     fill = obj.get('fill', '#ff0000')
                                     
-                                    if isinstance(fill, str) and fill.startswith('#'):
-                                        r = int(fill[1:3], 16) / 255
-                                        g = int(fill[3:5], 16) / 255
-                                        b = int(fill[5:7], 16) / 255
-                                        c.setFillColorRGB(r, g, b)
-                                    else:
-                                        c.setFillColorRGB(1, 0, 0)
+                                    c.setFillColorRGB(*annotation_rgb(fill))
                                     
-                                    c.setFont(UNICODE_FONT, font_size)
+                                    c.setFont(unicode_font, font_size)
                                     # Prefer saved lines from the canvas for exact parity
                                     saved_lines = obj.get('lines')
                                     max_w = max(0, (width_scaled - 2))
                                     lines = sanitize_saved_lines(saved_lines) if isinstance(saved_lines, list) and saved_lines else \
-                                        wrap_text_to_width(text, UNICODE_FONT, font_size, max_w)
+                                        wrap_text_to_width(text, unicode_font, font_size, max_w)
 
                                     for i, line in enumerate(lines):
                                         try:
                                             # Horizontal alignment: left/center/right within the textbox
                                             if text_align == 'center':
-                                                tx = left + (max_w - pdfmetrics.stringWidth(line, UNICODE_FONT, font_size)) / 2.0
+                                                tx = left + (max_w - pdfmetrics.stringWidth(line, unicode_font, font_size)) / 2.0
                                             elif text_align == 'right':
-                                                tx = left + (max_w - pdfmetrics.stringWidth(line, UNICODE_FONT, font_size))
+                                                tx = left + (max_w - pdfmetrics.stringWidth(line, unicode_font, font_size))
                                             else:
                                                 tx = left
                                             ty = base_y + height_scaled - (i + 1) * font_size * line_height
@@ -662,23 +670,17 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                                                 c.drawString(tx, ty, line)
                                             except:
                                                 pass
-                                    print(f"      -> Drew text '{text}' at ({left}, {base_y})")
+                                    logger.debug("export drew text %r at (%s, %s)", text, left, base_y)
                                         
                                 elif otype == 'circle':
                                     radius = float(obj.get('radius', 0.05)) * dw  # normalized radius
                                     cx = left + width_scaled / 2
                                     cy = base_y + height_scaled / 2
                                     stroke = obj.get('stroke', '#ff0000')
-                                    if isinstance(stroke, str) and stroke.startswith('#'):
-                                        r = int(stroke[1:3], 16) / 255
-                                        g = int(stroke[3:5], 16) / 255
-                                        b = int(stroke[5:7], 16) / 255
-                                        c.setStrokeColorRGB(r, g, b)
-                                    else:
-                                        c.setStrokeColorRGB(1, 0, 0)
+                                    c.setStrokeColorRGB(*annotation_rgb(stroke))
                                     c.setLineWidth(int(obj.get('strokeWidth', 2)))
                                     c.circle(cx, cy, radius, stroke=1, fill=0)
-                                    print(f"      -> Drew circle at ({cx}, {cy}) radius {radius}")
+                                    logger.debug("export drew circle at (%s, %s) radius %s", cx, cy, radius)
                                 continue
 
                             # Backward-compat: Fabric-style absolute objects
@@ -697,32 +699,23 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                                         continue
                                 except Exception:
                                     pass
-                                text = obj.get('text', '')
-                                # Standardize icons and Vietnamese labels for PDF
-                                try:
-                                    text = text.replace('✅', '✓').replace('❌', '✗')
-                                    text = text.replace('⚠️', '!').replace('⚠', '!')
-                                    # English -> Vietnamese for common labels
-                                    text = text.replace('Incorrect', 'sai').replace('Correct', 'đúng')
-                                except Exception:
-                                    pass
-                                text = normalize_math_text(decode_unicode_escapes(text))
+                                text = normalize_math_text(decode_unicode_escapes(normalize_annotation_text(obj.get('text', ''))))
                                 font_size = int(obj.get('fontSize', 16))
                                 line_height = float(obj.get('lineHeight', 1.2))
                                 text_align = (obj.get('textAlign') or 'left').lower()
                                 c.setFillColorRGB(1, 0, 0)
-                                c.setFont(UNICODE_FONT, font_size)
+                                c.setFont(unicode_font, font_size)
                                 # Prefer saved lines from the canvas
                                 saved_lines = obj.get('lines')
                                 max_w = max(0, (width - 2))
                                 lines = sanitize_saved_lines(saved_lines) if isinstance(saved_lines, list) and saved_lines else \
-                                    wrap_text_to_width(text, UNICODE_FONT, font_size, max_w)
+                                    wrap_text_to_width(text, unicode_font, font_size, max_w)
                                 for i, line in enumerate(lines):
                                     try:
                                         if text_align == 'center':
-                                            tx = base_x + (max_w - pdfmetrics.stringWidth(line, UNICODE_FONT, font_size)) / 2.0
+                                            tx = base_x + (max_w - pdfmetrics.stringWidth(line, unicode_font, font_size)) / 2.0
                                         elif text_align == 'right':
-                                            tx = base_x + (max_w - pdfmetrics.stringWidth(line, UNICODE_FONT, font_size))
+                                            tx = base_x + (max_w - pdfmetrics.stringWidth(line, unicode_font, font_size))
                                         else:
                                             tx = base_x
                                         ty = base_y + (height - (i + 1) * font_size * line_height)
@@ -754,11 +747,7 @@ class SubmissionViewSet(viewsets.ModelViewSet):
                 continue
         c.save()
 
-        media_root = str(settings.MEDIA_ROOT)
-        media_url = settings.MEDIA_URL.rstrip("/")
-        rel = str(out_path)[len(media_root):].lstrip("/")
-        url = request.build_absolute_uri(f"{media_url}/{rel}")
-        return Response({"pdf_url": url})
+        return Response({"pdf_url": media_url(request, out_path)})
 
 
 class GradeItemAPIView(APIView):
@@ -780,33 +769,15 @@ class ItemDetailAPIView(APIView):
         except SubmissionItem.DoesNotExist:
             return Response({"detail": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        media_root = str(settings.MEDIA_ROOT)
-        media_url = settings.MEDIA_URL.rstrip("/")
-
-        def to_url(p: str) -> str:
-            sp = str(p)
-            if sp.startswith(media_root):
-                rel = sp[len(media_root):].lstrip("/")
-                return f"{media_url}/{rel}"
-            return sp
-
         # Filter out missing files (unicode-safe) and persist cleanup
-        existing_paths = []
-        for p in (item.answer_image_paths or []):
-            if normalized_path_exists(p):
-                existing_paths.append(p)
-        if existing_paths != (item.answer_image_paths or []):
-            item.answer_image_paths = existing_paths
-            item.has_multiple_images = len(existing_paths) > 1
-            item.save(update_fields=["answer_image_paths", "has_multiple_images"])
-
-        answer_urls = [to_url(p) for p in existing_paths]
+        existing_paths = _prune_missing_answer_images(item, existing_path_set(item.answer_image_paths or []))
+        answer_urls = [media_url(None, p) for p in existing_paths]
 
         return Response({
             "id": item.id,
             "submission_id": item.submission_id,
             "question_id": item.question_id,
-            "question_label": f"{item.question.order_index}{item.question.part_label or ''}",
+            "question_label": item.question.label,
             "source_page_indices": item.source_page_indices or [],
             "answer_image_paths": item.answer_image_paths or [],
             "answer_image_urls": answer_urls,
@@ -822,39 +793,18 @@ class ItemDetailAPIView(APIView):
         })
 
     def put(self, request, item_id: int):
-        import json
-        print(f"\n=== PUT /items/{item_id}/ ===")
-        print(f"Request data: {json.dumps(request.data, indent=2)}")
-        
         try:
-            item = SubmissionItem.objects.get(id=item_id)
+            item = SubmissionItem.objects.only("id", "annotations").get(id=item_id)
         except SubmissionItem.DoesNotExist:
-            print(f"Item {item_id} not found")
             return Response({"detail": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
         
         data = request.data or {}
         annotations = data.get("annotations")
         
-        print(f"Annotations received: {type(annotations)}, length: {len(annotations) if isinstance(annotations, list) else 'N/A'}")
-        
         if annotations is None:
-            print("ERROR: annotations is None")
             return Response({"detail": "annotations is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Sanitize annotations: normalize symbols and deduplicate exact duplicates
-        def _normalize_text_symbols(text: str) -> str:
-            try:
-                # Normalize common icons to PDF-safe symbols
-                normalized = str(text or "")
-                normalized = normalized.replace('✅', '✓').replace('❌', '✗')
-                # Replace warning emoji with ASCII to avoid tofu/rectangles in PDF
-                normalized = normalized.replace('⚠️', '!').replace('⚠', '!')
-                # Common label normalization
-                normalized = normalized.replace('Incorrect', 'sai').replace('Correct', 'đúng')
-                return normalized
-            except Exception:
-                return str(text or "")
-
         def _roundf(v):
             try:
                 return round(float(v), 4)
@@ -862,8 +812,8 @@ class ItemDetailAPIView(APIView):
                 return v
 
         def _dedup(anns):
-            seen = set()
-            cleaned = []
+            # Insertion-ordered: first occurrence of each key wins
+            cleaned = {}
             for obj in anns or []:
                 if not isinstance(obj, dict):
                     continue
@@ -871,7 +821,7 @@ class ItemDetailAPIView(APIView):
                 # Normalize text if present
                 text = obj.get('text')
                 if text is not None:
-                    text = _normalize_text_symbols(text)
+                    text = normalize_annotation_text(text)
                 # Build a dedup key based on type, geometry and text
                 key = (
                     otype,
@@ -881,22 +831,24 @@ class ItemDetailAPIView(APIView):
                     _roundf(obj.get('width')), _roundf(obj.get('height')),
                     text,
                 )
-                if key in seen:
+                if key in cleaned:
                     continue
-                seen.add(key)
                 # Write back normalized text
                 if text is not None:
                     obj = {**obj, 'text': text}
-                cleaned.append(obj)
-            return cleaned
+                cleaned[key] = obj
+            return list(cleaned.values())
 
         annotations = _dedup(annotations)
 
+        # Saving an untouched canvas is common; skip the UPDATE when nothing actually changed
+        if annotations == item.annotations:
+            logger.debug("Annotations for item %s unchanged, not saving", item_id)
+            return Response({"id": item.id, "annotations": item.annotations})
+
         item.annotations = annotations
         item.save(update_fields=["annotations"])
-        
-        print(f"Saved {len(annotations) if isinstance(annotations, list) else 0} annotations to item {item_id}")
-        print("=== END PUT ===\n")
+        logger.debug("Saved %d annotations to item %s", len(annotations), item_id)
         
         return Response({"id": item.id, "annotations": item.annotations})
 
@@ -997,22 +949,7 @@ class ItemAppendImageView(APIView):
         item.save(update_fields=["answer_image_paths", "has_multiple_images", "source_page_indices"])
 
         # Build URLs back
-        media_root = str(settings.MEDIA_ROOT)
-        media_url = settings.MEDIA_URL.rstrip("/")
-        urls = []
-        for p in existing_paths:
-            sp = str(p)
-            try:
-                import unicodedata
-                normalized_path = unicodedata.normalize('NFC', sp)
-                normalized_media_root = unicodedata.normalize('NFC', media_root)
-                if normalized_path.startswith(normalized_media_root):
-                    rel = normalized_path[len(normalized_media_root):].lstrip("/")
-                    urls.append(f"{media_url}/{rel}")
-                else:
-                    urls.append(sp)
-            except Exception:
-                urls.append(sp)
+        urls = [media_url(None, p) for p in existing_paths]
 
         return Response({
             "item_id": item.id,
@@ -134,6 +134,10 @@ MAX_IMAGE_SIZE_MB = float(os.getenv("MAX_IMAGE_SIZE_MB", "50"))
 MAX_PDF_SIZE_MB = float(os.getenv("MAX_PDF_SIZE_MB", "20"))
 SUPPORTED_IMAGE_FORMATS = ["png", "jpg", "jpeg"]
 SUPPORTED_FILE_FORMATS = ["png", "jpg", "jpeg", "pdf"]
+# Uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are streamed to a temp file in chunks and
+# then moved into MEDIA_ROOT; keep the temp dir on the same volume so the move is a rename
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv("FILE_UPLOAD_MAX_MEMORY_SIZE", str(2_621_440)))
+FILE_UPLOAD_TEMP_DIR = os.getenv("FILE_UPLOAD_TEMP_DIR") or None
 
 
 REST_FRAMEWORK = {
@@ -192,6 +196,15 @@ CSRF_TRUSTED_ORIGINS = [
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
+# Seconds to wait for each solver request attempt (connecting is capped at 10s); the SDK default is 10 minutes
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+# Retries (with backoff) the OpenAI SDK makes on 429/5xx/timeouts before the solver gives up
+# or switches to OPENAI_SOLVER_FALLBACK_MODEL (one attempt, no retries). Worst case per solve is
+# (OPENAI_MAX_RETRIES + 1) * OPENAI_TIMEOUT_SECONDS, plus one more timeout with a fallback model
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+# Longest edge (px) of question images sent to the solver. OpenAI scales "high" detail images
+# into 2048x2048 anyway, so anything larger only costs upload time (0 = send as-is)
+OPENAI_MAX_IMAGE_DIM = int(os.getenv("OPENAI_MAX_IMAGE_DIM", "2048"))
 
 
 # Feature flags
@@ -205,6 +218,44 @@ AUTO_GRADE_ON_CREATE = os.getenv("AUTO_GRADE_ON_CREATE", "false").lower() == "tr
 # Gemini Flash can handle high concurrency, but 10 per submission is safe
 MAX_CONCURRENT_GRADING = int(os.getenv("MAX_CONCURRENT_GRADING", "10"))
 
+# Process-wide limits on Gemini calls (worker threads and regrade pools share them):
+# in-flight requests, requests per minute (0 = unlimited) and retries on 429/5xx
+GEMINI_MAX_CONCURRENT = int(os.getenv("GEMINI_MAX_CONCURRENT", "10"))
+GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "0"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+# Longest edge (px) of images sent for grading; larger photos are re-encoded as JPEG (0 = send as-is)
+GEMINI_MAX_IMAGE_DIM = int(os.getenv("GEMINI_MAX_IMAGE_DIM", "1568"))
+
+# Jobs each run_job_worker process runs in parallel (threads); grading jobs are I/O-bound
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "1"))
+
+# Reuse a stored grading result when the exact same images/prompt/model are graded again
+# (temperature is 0, so a repeat call would only cost time and tokens). Stored on disk so
+# it survives restarts and is shared by all worker processes.
+GRADING_CACHE_ENABLED = os.getenv("GRADING_CACHE_ENABLED", "true").lower() == "true"
+
+# Same for reference solutions: identical question images with the same model/prompt reuse the
+# stored solution. Pressing Solve again on a question that already has one always asks the model.
+SOLVER_CACHE_ENABLED = os.getenv("SOLVER_CACHE_ENABLED", "true").lower() == "true"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "grading": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("GRADING_CACHE_DIR", str(BASE_DIR / ".cache" / "grading")),
+        "TIMEOUT": 60 * 60 * 24 * 30,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    "solver": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("SOLVER_CACHE_DIR", str(BASE_DIR / ".cache" / "solver")),
+        "TIMEOUT": 60 * 60 * 24 * 30,
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    },
+}
+
 
 # Logging
 LOGGING = {
@@ -1,28 +1,53 @@
-from django.shortcuts import render
-from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 from pathlib import Path
-import os
+from typing import Optional, Tuple
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Built React app (FE folder)
+FRONTEND_INDEX = BASE_DIR.parent.parent / "FE" / "dist" / "index.html"
+
+# (mtime_ns, contents) of the last index.html read; a rebuild changes the mtime
+_index_cache: Optional[Tuple[int, bytes]] = None
+
+
+def _read_index() -> Optional[bytes]:
+    global _index_cache
+    try:
+        mtime = FRONTEND_INDEX.stat().st_mtime_ns
+    except OSError:
+        return None
+    cached = _index_cache
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, FRONTEND_INDEX.read_bytes())
+        _index_cache = cached
+    return cached[1]
+
 
 def serve_frontend(request, path=""):
     """
     Serve the React frontend for all non-API routes.
     This allows React Router to handle client-side routing.
     """
-    # Get the path to the built React app (FE folder)
-    frontend_dir = BASE_DIR.parent.parent / "FE" / "dist"
-    index_file = frontend_dir / "index.html"
-    
+    content = _read_index()
+
     # If the index.html file doesn't exist, return a 404
-    if not index_file.exists():
-        from django.http import HttpResponseNotFound
+    if content is None:
         return HttpResponseNotFound("Frontend not found. Please build the React app.")
-    
-    # Read and serve the index.html file
-    content = index_file.read_text(encoding='utf-8')
-    
-    from django.http import HttpResponse
-    response = HttpResponse(content, content_type='text/html')
+
+    return HttpResponse(content, content_type='text/html; charset=utf-8')
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Serve an uploaded/cropped image, letting the browser keep its copy.
+
+    Crops can be overwritten in place under the same name, so responses are marked
+    for revalidation instead of heuristic caching; static.serve answers the
+    If-Modified-Since revalidation with a bodyless 304 after a single stat().
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    patch_cache_control(response, no_cache=True)
     return response